@@ -0,0 +1,96 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'db_sticky:{user_id}'
+
+_replica = ContextVar('replica', default=None)
+
+
+def replica_aliases():
+    return settings.DATABASE_REPLICAS
+
+
+def is_sticky(user):
+    """
+    Пользователь недавно что-то изменил: его чтения идут в основную
+    БД, пока реплики не догонят запись.
+    """
+    return bool(user.is_authenticated
+                and cache.get(STICKY_KEY.format(user_id=user.pk)))
+
+
+def mark_sticky(user):
+    if user.is_authenticated:
+        cache.set(STICKY_KEY.format(user_id=user.pk), True,
+                  settings.DB_REPLICA_STICKY_SECONDS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтения представлений с ReplicaReadMixin распределяются по
+    репликам (DB_REPLICAS), все остальные запросы, записи и чтения
+    внутри транзакции идут в основную БД. Миграции выполняются только
+    на основной БД, реплики получают схему потоковой репликацией.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    Чтение с реплик для безопасных методов. Решение принимается
+    после аутентификации: пользователь с отметкой о недавней записи
+    читает из основной БД. Все чтения запроса идут в одну реплику.
+    """
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        replicas = replica_aliases()
+        if (replicas and request.method in SAFE_METHODS
+                and not is_sticky(request.user)):
+            self._replica_token = _replica.set(random.choice(replicas))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            _replica.reset(self._replica_token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args,
+                                         **kwargs)
+
+
+class StickyPrimaryMiddleware:
+    """
+    Отметка о записи для read-your-writes: после успешного
+    изменяющего запроса чтения пользователя DB_REPLICA_STICKY_SECONDS
+    секунд идут в основную БД. Пользователь, аутентифицированный
+    токеном в DRF, к этому моменту уже записан в request.user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and replica_aliases() and hasattr(request, 'user')):
+            mark_sticky(request.user)
+        return response
@@ -0,0 +1,329 @@
+import glob
+import hmac
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+METRICS = {
+    'request_duration_seconds': (
+        'Время обработки запроса',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    'db_duration_seconds': (
+        'Время выполнения SQL-запросов',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    ),
+    'serializer_duration_seconds': (
+        'Время работы сериализаторов (с запросами, выполненными в них)',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    ),
+    'db_queries': (
+        'Число SQL-запросов',
+        (1, 2, 5, 10, 20, 50, 100, 200),
+    ),
+}
+COUNTERS = {
+    'throttled_requests_total': 'Запросы, отклоненные ограничением частоты',
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Файл с суммой значений завершившихся процессов.
+EXITED_FILE = 'exited.json'
+
+_timings = ContextVar('request_timings', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Обертка connection.execute_wrapper: время и число запросов.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+@contextmanager
+def timed_serializer():
+    """
+    Замер времени сериализации в замеряемом запросе. Вложенные
+    вызовы (вложенные сериализаторы, элементы списка) учитываются
+    только во внешнем.
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    timings.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serializer_depth -= 1
+        if not timings.serializer_depth:
+            timings.serializer += time.perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """
+    Замер времени to_representation сериализатора вместе
+    с SQL-запросами, выполненными в нем. При many=True замеряется
+    представление каждого элемента.
+    """
+
+    def to_representation(self, instance):
+        with timed_serializer():
+            return super().to_representation(instance)
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.tmp', 'w') as file:
+        file.write(data)
+    os.replace(f'{path}.tmp', path)
+
+
+def _merge(total, values):
+    for key, counts in values.items():
+        if key in total:
+            total[key] = [a + b for a, b in zip(total[key], counts)]
+        else:
+            total[key] = counts
+    return total
+
+
+class Registry:
+    """
+    Гистограммы и счетчики одного процесса. Каждый воркер gunicorn
+    пишет свой файл в METRICS_DIR (атомарной заменой, не чаще
+    METRICS_FLUSH_INTERVAL секунд), эндпоинт метрик суммирует файлы
+    всех процессов, поэтому блокировки между процессами не нужны.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.values = {}
+        self.flushed_at = 0.0
+
+    def observe(self, labels, timings, total):
+        observations = {
+            'request_duration_seconds': total,
+            'db_duration_seconds': timings.db,
+            'serializer_duration_seconds': timings.serializer,
+            'db_queries': timings.queries,
+        }
+        with self.lock:
+            self._check_pid()
+            for name, value in observations.items():
+                buckets = METRICS[name][1]
+                key = json.dumps([name, labels])
+                counts = self.values.setdefault(key, [0] * (len(buckets) + 2))
+                for index, bound in enumerate(buckets):
+                    if value <= bound:
+                        counts[index] += 1
+                counts[-2] += value
+                counts[-1] += 1
+        self._maybe_flush()
+
+    def increment(self, name, labels):
+        with self.lock:
+            self._check_pid()
+            key = json.dumps([name, labels])
+            self.values.setdefault(key, [0])[0] += 1
+        self._maybe_flush()
+
+    def _check_pid(self):
+        if self.pid != os.getpid():
+            # Данные родителя после fork не дублируются.
+            self.pid, self.values = os.getpid(), {}
+
+    def _maybe_flush(self):
+        if time.monotonic() - self.flushed_at >= (
+                settings.METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.pid is None:
+                return
+            data = json.dumps(self.values)
+            self.flushed_at = time.monotonic()
+        _write(os.path.join(settings.METRICS_DIR, f'{self.pid}.json'), data)
+
+
+registry = Registry()
+
+
+def collect():
+    """
+    Сумма гистограмм и счетчиков всех процессов.
+    """
+    registry.flush()
+    total = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        _merge(total, _read(path))
+    return total
+
+
+def reset_processes():
+    """
+    Очистка METRICS_DIR при запуске сервера (хук gunicorn
+    on_starting): файлы процессов прошлого запуска не суммируются.
+    """
+    shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
+
+
+def process_exited(pid):
+    """
+    Перенос значений завершившегося процесса в общий файл (хук
+    gunicorn child_exit, выполняется в главном процессе): число
+    файлов не растет при перезапуске воркеров, а суммы счетчиков
+    не уменьшаются.
+    """
+    path = os.path.join(settings.METRICS_DIR, f'{pid}.json')
+    if not os.path.exists(path):
+        return
+    exited = os.path.join(settings.METRICS_DIR, EXITED_FILE)
+    _write(exited, json.dumps(_merge(_read(exited), _read(path))))
+    os.remove(path)
+
+
+def _format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def render(values):
+    """
+    Гистограммы и счетчики в текстовом формате Prometheus.
+    """
+    series = {}
+    for key, counts in values.items():
+        name, labels = json.loads(key)
+        series.setdefault(name, []).append((labels, counts))
+    lines = []
+    for name, (description, buckets) in METRICS.items():
+        metric = f'foodgram_{name}'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} histogram')
+        for labels, counts in sorted(series.get(name, ()),
+                                     key=lambda item: sorted(item[0].items())):
+            for bound, count in zip(buckets, counts):
+                lines.append(f'{metric}_bucket'
+                             f'{{{_format_labels(labels, le=bound)}}} {count}')
+            lines.append(f'{metric}_bucket'
+                         f'{{{_format_labels(labels, le="+Inf")}}} '
+                         f'{counts[-1]}')
+            lines.append(f'{metric}_sum{{{_format_labels(labels)}}} '
+                         f'{counts[-2]}')
+            lines.append(f'{metric}_count{{{_format_labels(labels)}}} '
+                         f'{counts[-1]}')
+    for name, description in COUNTERS.items():
+        metric = f'foodgram_{name}'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} counter')
+        for labels, counts in sorted(series.get(name, ()),
+                                     key=lambda item: sorted(item[0].items())):
+            lines.append(f'{metric}{{{_format_labels(labels)}}} {counts[0]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Метрики для Prometheus, нужен заголовок Authorization: Bearer
+    <METRICS_TOKEN>. Без METRICS_TOKEN эндпоинт закрыт.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+class PerformanceMiddleware:
+    """
+    Замер доли METRICS_SAMPLE_RATE запросов: число и время
+    SQL-запросов на всех соединениях, время сериализаторов и общее
+    время. Значения передаются в заголовке Server-Timing и
+    копятся в гистограммах по имени маршрута (recipes-list,
+    recipes-download-shopping-cart).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        timings = Timings()
+        start = time.perf_counter()
+        with self.measure(timings):
+            response = self.get_response(request)
+        match = request.resolver_match
+        route = match.url_name if match and match.url_name else 'unmatched'
+        labels = {'route': route, 'method': request.method}
+        response['Server-Timing'] = (
+            f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"'
+            f', ser;dur={timings.serializer * 1000:.1f}'
+            f', total;dur={(time.perf_counter() - start) * 1000:.1f}'
+        )
+        if route == 'metrics':
+            return response
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, labels, timings, start)
+        else:
+            registry.observe(labels, timings, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    @contextmanager
+    def measure(timings):
+        token = _timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                yield
+        finally:
+            _timings.reset(token)
+
+    def stream(self, content, labels, timings, start):
+        """
+        Тело потокового ответа формируется после выхода из
+        middleware: запросы при выдаче тоже замеряются, значения
+        попадают в гистограммы после отправки ответа (в заголовке
+        Server-Timing - только время до начала выдачи).
+        """
+        try:
+            with self.measure(timings):
+                yield from content
+        finally:
+            registry.observe(labels, timings, time.perf_counter() - start)
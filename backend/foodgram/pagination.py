@@ -1,5 +1,57 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+MAX_PAGE_SIZE = 100
 
 
 class LimitPageNumberPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class LimitCursorPaginator(CursorPagination):
+    """
+    Keyset-пагинация по убыванию id: без OFFSET и COUNT(*),
+    время выдачи не зависит от глубины страницы.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = '-id'
+
+
+class OptionalCursorPaginator(LimitPageNumberPaginator):
+    """
+    По умолчанию - постраничная выдача (?page=, ?limit=).
+    С параметром ?paginate=cursor или ?cursor= - keyset-пагинация
+    с непрозрачными курсорами в ссылках next/previous.
+    Курсор задает порядок по убыванию id, поэтому параметры из
+    cursor_ordering_params view (меняющие порядок выдачи) с ним
+    не сочетаются - возвращается 400.
+    """
+    cursor_query_param = 'cursor'
+    cursor_mode_query_param = 'paginate'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if (self.cursor_query_param in request.query_params
+                or request.query_params.get(
+                    self.cursor_mode_query_param) == 'cursor'):
+            conflicts = [
+                param for param in getattr(view, 'cursor_ordering_params', ())
+                if request.query_params.get(param)
+            ]
+            if conflicts:
+                raise ValidationError({
+                    param: 'Не поддерживается с keyset-пагинацией '
+                           '(?paginate=cursor): выдача упорядочена по id'
+                    for param in conflicts
+                })
+            self.cursor_paginator = LimitCursorPaginator()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,5 +1,7 @@
 import os
+import tempfile
 
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext_lazy as _
 from dotenv import load_dotenv
 
@@ -9,7 +11,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = os.getenv('SECRET_KEY', default='9lcphoq3k=1+hygjlwetyxtuuuo!R7D!!6@Bkp7sl%6t94tamg')
 
-DEBUG = False
+DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', default='*').split(',')
 # ALLOWED_HOSTS = ['51.250.103.156', 'foodgram.zapto.org', 'localhost', '127.0.0.1']
@@ -33,11 +35,13 @@ INSTALLED_APPS = [
 FORM_RENDERER = 'django.forms.renderers.TemplatesSetting'
 
 MIDDLEWARE = [
+    'foodgram.metrics.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.db_router.StickyPrimaryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,6 +86,26 @@ else:
         }
     }
 
+# Реплики для чтения: DB_REPLICAS - адреса host[:port] через запятую
+# (для SQLite - пути к файлам копий БД). Безопасные запросы
+# представлений с ReplicaReadMixin читают из случайной реплики,
+# после записи пользователь DB_REPLICA_STICKY_SECONDS секунд читает
+# из основной БД.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if DATABASES[alias]['ENGINE'].endswith('sqlite3'):
+        DATABASES[alias]['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        DATABASES[alias]['HOST'] = host
+        DATABASES[alias]['PORT'] = port or DATABASES['default']['PORT']
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['foodgram.db_router.PrimaryReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,6 +136,106 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Файлы, которые отдаются только через API (PDF списков покупок):
+# каталог вне MEDIA_ROOT, nginx не публикует его по MEDIA_URL.
+PRIVATE_MEDIA_ROOT = os.getenv('PRIVATE_MEDIA_ROOT',
+                               os.path.join(BASE_DIR, 'private'))
+
+# Метрики производительности: доля замеряемых запросов (0 - замеры
+# выключены), каталог с гистограммами процессов, интервал их записи
+# и токен для /api/_metrics (пустой - эндпоинт закрыт).
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', 1))
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics'))
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Общий для всех воркеров и серверов кэш (memcached или redis):
+# версии справочников, снимки токенов, хэши PDF, метки чтения
+# с основной БД. Файловый кэш по умолчанию допустим только при DEBUG.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+    },
+}
+# Состояние ограничителей частоты запросов: по умолчанию тот же кэш,
+# что и default, со своим префиксом ключей.
+CACHES['throttle'] = {
+    'BACKEND': os.getenv('THROTTLE_CACHE_BACKEND',
+                         CACHES['default']['BACKEND']),
+    'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION',
+                          CACHES['default']['LOCATION']),
+    'KEY_PREFIX': 'throttle',
+}
+# Бэкенды с данными, общими для всех серверов, и атомарными incr/decr.
+# Локальный и файловый кэш видны только одному контейнеру, incr в них -
+# это get и set: параллельные запросы теряют приращения.
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.memcached.MemcachedCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+    'django_redis.cache.RedisCache',
+)
+for alias, variable in (('default', 'CACHE_BACKEND'),
+                        ('throttle', 'THROTTLE_CACHE_BACKEND')):
+    if not DEBUG and CACHES[alias]['BACKEND'] not in SHARED_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f'{variable}: без DEBUG нужен общий для всех серверов кэш '
+            f'(memcached или redis)')
+
+# Готовые PDF со списком покупок отдает nginx по X-Accel-Redirect
+# (internal location, указывающий на PRIVATE_MEDIA_ROOT). Пустое значение -
+# файл отдает Django.
+SHOPPING_LIST_ACCEL_REDIRECT = os.getenv('SHOPPING_LIST_ACCEL_REDIRECT',
+                                         '/protected/')
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_PDF_MAX_AGE = 60 * 60 * 24 * 7
+# Неудачный рендеринг повторяется не больше SHOPPING_LIST_PDF_MAX_ATTEMPTS
+# раз с удвоением задержки, начиная с SHOPPING_LIST_PDF_RETRY_DELAY секунд.
+SHOPPING_LIST_PDF_MAX_ATTEMPTS = 3
+SHOPPING_LIST_PDF_RETRY_DELAY = 60
+# Фоновые процессы (render_shopping_lists, render_image_variants)
+# помечают взятые записи и обрабатывают их вне транзакции. Записи,
+# взятые раньше BACKGROUND_CLAIM_TIMEOUT секунд назад (процесс
+# завершился во время обработки), берутся повторно.
+BACKGROUND_CLAIM_TIMEOUT = 10 * 60
+
+# Производные изображения рецептов: ширина в пикселях для каждого
+# варианта. Файлы готовит фоновый процесс render_image_variants,
+# формат - WEBP или AVIF (если Pillow собран с его поддержкой).
+RECIPE_IMAGE_VARIANTS = {
+    'thumb': 320,
+    'card': 640,
+    'full': 1280,
+}
+RECIPE_IMAGE_FORMAT = os.getenv('RECIPE_IMAGE_FORMAT', 'WEBP')
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+# Лента подписок: рецепты авторов, у которых подписчиков не больше
+# FEED_FANOUT_MAX_FOLLOWERS, при публикации записываются в ленты
+# пачками по FEED_FANOUT_BATCH; рецепты более популярных авторов
+# выбираются при чтении ленты. При подписке в ленту добавляются
+# FEED_BACKFILL последних рецептов автора.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS',
+                                          5000))
+FEED_FANOUT_BATCH = 1000
+FEED_BACKFILL = 20
+
+# Конфигурация полнотекстового поиска PostgreSQL (стемминг). После
+# изменения нужно пересчитать документы: manage.py rebuild_search.
+SEARCH_CONFIG = os.getenv('SEARCH_CONFIG', 'russian')
+# Сколько новейших совпадений ранжируется по релевантности.
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 1000))
+
+# Лимиты загружаемого изображения рецепта: объем после декодирования
+# base64 и число пикселей (проверяется по заголовку файла).
+RECIPE_IMAGE_MAX_BYTES = int(os.getenv('RECIPE_IMAGE_MAX_BYTES',
+                                       10 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS',
+                                        40 * 1000 * 1000))
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -127,17 +251,26 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
+    # Token bucket для добавления в избранное, список покупок
+    # и подписок (foodgram.throttling): емкость/период.
+    'DEFAULT_THROTTLE_RATES': {
+        'relations_user': os.getenv('THROTTLE_RELATIONS_USER', '60/min'),
+        'relations_ip': os.getenv('THROTTLE_RELATIONS_IP', '300/min'),
+    },
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ]
 }
 
 
+# Время жизни снимка токена и пользователя в кэше, секунд.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'USER_ID_FIELD': 'id',
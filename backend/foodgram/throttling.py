@@ -0,0 +1,106 @@
+import time
+
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+KEY_PERIODS = 10
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket в виде GCRA: в общем кэше (алиас throttle) хранится
+    теоретическое время прибытия следующего запроса (TAT, мс).
+    Разрешенный запрос - один incr, атомарный в memcached и redis
+    (без DEBUG другие бэкенды не допускаются настройками). Второе обращение
+    нужно, только если корзины еще нет, она простаивала (TAT
+    в прошлом) или запрос отклонен (приращение откатывается).
+    Скорость задается в DEFAULT_THROTTLE_RATES по scope в формате
+    DRF: '30/min' - емкость 30 запросов, восполнение 30 в минуту.
+    Ограничиваются только изменяющие запросы: чтение на том же
+    адресе (сводный список покупок) корзину не расходует.
+    """
+    scope = None
+    cache_alias = 'throttle'
+    cache_format = 'bucket:{scope}:{ident}'
+
+    def __init__(self):
+        rate = api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        num, period = rate.split('/')
+        self.capacity = int(num)
+        self.interval = DURATIONS[period[0]] * 1000 // self.capacity
+        self.tolerance = self.interval * (self.capacity - 1)
+        self.retry_after = None
+
+    def get_ident_key(self, request):
+        """
+        Идентификатор корзины или None, если ограничение
+        к запросу не применяется.
+        """
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return True
+        cache = caches[self.cache_alias]
+        key = self.cache_format.format(scope=self.scope, ident=ident)
+        now = int(time.time() * 1000)
+        # incr не продлевает срок жизни ключа: при постоянной нагрузке
+        # ключ истекает и корзина заполняется заново, поэтому срок
+        # берется с запасом в несколько периодов.
+        timeout = (self.tolerance + self.interval) * KEY_PERIODS // 1000 + 1
+        try:
+            tat = cache.incr(key, self.interval) - self.interval
+        except ValueError:
+            if cache.add(key, now + self.interval, timeout):
+                return True
+            tat = cache.incr(key, self.interval) - self.interval
+        if tat < now:
+            cache.set(key, now + self.interval, timeout)
+            return True
+        if tat - now <= self.tolerance:
+            return True
+        cache.decr(key, self.interval)
+        self.retry_after = (tat - self.tolerance - now) / 1000
+        match = request.resolver_match
+        registry.increment('throttled_requests_total', {
+            'scope': self.scope,
+            'route': match.url_name if match else 'unmatched',
+        })
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserRelationThrottle(TokenBucketThrottle):
+    """
+    Добавление в избранное, список покупок и подписки:
+    корзина пользователя.
+    """
+    scope = 'relations_user'
+
+    def get_ident_key(self, request):
+        if request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPRelationThrottle(TokenBucketThrottle):
+    """
+    Те же действия: корзина IP-адреса (с учетом NUM_PROXIES).
+    """
+    scope = 'relations_ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+RELATION_THROTTLES = (UserRelationThrottle, IPRelationThrottle)
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from .metrics import metrics_view
+
 
 api_patterns = [
     path('', include('users.urls', namespace='api_users')),
@@ -9,5 +11,6 @@ api_patterns = [
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics', metrics_view, name='metrics'),
     path('api/', include(api_patterns)),
 ]
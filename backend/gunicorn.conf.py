@@ -0,0 +1,13 @@
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def on_starting(server):
+    from foodgram.metrics import reset_processes
+    reset_processes()
+
+
+def child_exit(server, worker):
+    from foodgram.metrics import process_exited
+    process_exited(worker.pid)
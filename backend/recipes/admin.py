@@ -5,6 +5,16 @@ from django.utils.translation import gettext_lazy as _
 from .forms import TagForm
 from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
                      ShoppingList, Tag)
+from .utils.shopping_list import rebuild_shopping_items
+
+
+def rebuild_carts(recipe_ids):
+    """
+    Правка ингредиентов через админку идет по одной записи, без
+    приращений: сводные списки владельцев рецептов пересчитываются.
+    """
+    rebuild_shopping_items(ShoppingList.objects.filter(
+        recipe_id__in=recipe_ids).values_list('user_id', flat=True))
 
 
 @admin.register(Tag)
@@ -34,9 +44,10 @@ class IngredientAdmin(admin.ModelAdmin):
     empty_value_display = settings.EMPTY_VALUE
 
     def get_recipes_count(self, obj):
-        return RecipeIngredient.objects.filter(ingredient=obj.id).count()
+        return obj.usage_count
 
     get_recipes_count.short_description = _('Использований в рецептах')
+    get_recipes_count.admin_order_field = 'usage_count'
 
 
 class RecipeIngredientsInline(admin.TabularInline):
@@ -61,6 +72,19 @@ class RecipeIngredientsAdmin(admin.ModelAdmin):
     )
     list_filter = ('id', 'recipe', 'ingredient')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rebuild_carts({obj.recipe_id, form.initial.get('recipe')})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_carts([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        rebuild_carts(recipe_ids)
+
 
 # @admin.register(RecipeTag)
 # class RecipeTagsAdmin(admin.ModelAdmin):
@@ -79,16 +103,33 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'author',
         'in_favorite',
+        'in_carts_count',
+        'image_status',
     )
     list_filter = ('name', 'author', 'tags',)
     readonly_fields = ('in_favorite',)
     inlines = (RecipeIngredientsInline,)
     empty_value_display = settings.EMPTY_VALUE
 
+    def get_readonly_fields(self, request, obj=None):
+        """
+        Автор не меняется: рецепт уже разослан в ленты подписчиков
+        автора и учтен в его счетчике рецептов.
+        """
+        if obj is None:
+            return self.readonly_fields
+        return self.readonly_fields + ('author',)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            rebuild_carts([form.instance.pk])
+
     def in_favorite(self, obj):
-        return obj.in_favorite.all().count()
+        return obj.favorites_count
 
     in_favorite.short_description = _('Количество добавлений в избранное')
+    in_favorite.admin_order_field = 'favorites_count'
 
 
 @admin.register(FavoriteRecipe)
@@ -0,0 +1,148 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog_version:{label}'
+DATA_KEY = 'catalog:{label}:{version}:{query}'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+# Выдачи с фильтром (подсказки по мере набора названия) многочисленны
+# и запрашиваются редко, поэтому хранятся недолго.
+CATALOG_FILTERED_CACHE_TIMEOUT = 5 * 60
+
+
+def get_catalog_version(model):
+    """
+    Текущая версия справочника. При потере ключа в кэше версия
+    начинается с текущего времени, чтобы не совпасть со старой.
+    """
+    return cache.get_or_set(
+        VERSION_KEY.format(label=model._meta.label_lower),
+        lambda: int(time.time() * 1000),
+        None,
+    )
+
+
+def _bump_catalog_version(model):
+    key = VERSION_KEY.format(label=model._meta.label_lower)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def bump_catalog_version(model):
+    """
+    Инвалидация всех закэшированных выдач справочника после фиксации
+    транзакции: иначе параллельный запрос мог бы закэшировать под
+    новой версией данные, прочитанные до фиксации.
+    """
+    transaction.on_commit(lambda: _bump_catalog_version(model))
+
+
+def get_catalog_mapping(model, key_field, value_field='pk'):
+    """
+    Словарь key_field -> value_field справочника. Хранится в кэше
+    до изменения версии справочника.
+    """
+    key = DATA_KEY.format(
+        label=model._meta.label_lower,
+        version=get_catalog_version(model),
+        query=f'{key_field}:{value_field}',
+    )
+    return cache.get_or_set(
+        key,
+        lambda: dict(model.objects.values_list(key_field, value_field)),
+        CATALOG_CACHE_TIMEOUT,
+    )
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    tags = {tag.strip() for tag in header.split(',')}
+    return etag in tags or '*' in tags
+
+
+class CachedCatalogMixin:
+    """
+    Кэширование списка редко меняющегося справочника (теги,
+    ингредиенты). Ключ включает версию, которую увеличивают сигналы
+    post_save/post_delete модели, и параметры, от которых зависит
+    выдача (get_catalog_query). Ответ содержит строгий ETag,
+    при совпадении If-None-Match возвращается 304 без тела.
+    """
+    catalog_cache_timeout = CATALOG_CACHE_TIMEOUT
+    catalog_filtered_cache_timeout = CATALOG_FILTERED_CACHE_TIMEOUT
+
+    def get_catalog_query(self, request):
+        """
+        Параметры выдачи для ключа кэша: пустая строка - весь
+        справочник.
+        """
+        return ''
+
+    def list(self, request, *args, **kwargs):
+        model = self.get_queryset().model
+        query = self.get_catalog_query(request)
+        key = DATA_KEY.format(
+            label=model._meta.label_lower,
+            version=get_catalog_version(model),
+            query=hashlib.md5(query.encode()).hexdigest(),
+        )
+        cached = cache.get(key)
+        if cached is None:
+            data = super().list(request, *args, **kwargs).data
+            etag = '"{}"'.format(hashlib.sha1(
+                JSONRenderer().render(data)).hexdigest())
+            cached = (etag, data)
+            cache.set(key, cached, self.catalog_filtered_cache_timeout
+                      if query else self.catalog_cache_timeout)
+        etag, data = cached
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы: If-None-Match по ETag и, для анонимных
+    пользователей, If-Modified-Since (флаги избранного и покупок
+    не отражаются в дате изменения рецепта, поэтому авторизованным
+    Last-Modified не отправляется).
+    """
+
+    @staticmethod
+    def get_validators(request, rows, *extra):
+        """
+        ETag и время последнего изменения для строк
+        RecipeQuerySet.validators() и дополнительных данных страницы.
+        """
+        etag = '"{}"'.format(
+            hashlib.sha1(repr((list(rows), extra)).encode()).hexdigest())
+        last_modified = None
+        if rows and not request.user.is_authenticated:
+            last_modified = int(max(
+                row['updated_at'] for row in rows).timestamp())
+        return etag, last_modified
+
+    def get_conditional_response(self, request, etag, last_modified):
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    @staticmethod
+    def set_validators(response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
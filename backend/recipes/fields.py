@@ -15,3 +15,28 @@ class HexColorField(models.CharField):
                 message=_('Введите корректное значение HEX кода цвета'),
             )
         )
+
+
+class LowercaseField(models.CharField):
+    """
+    Копия текстового поля source в нижнем регистре (str.lower()).
+    Заполняется при save() и bulk_create (pre_save); update()
+    и bulk_update ее не пересчитывают. Поиск без учета регистра
+    идет по этой колонке: LOWER() в SQLite меняет регистр только
+    латинских букв.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.source).lower()
+        setattr(model_instance, self.attname, value)
+        return value
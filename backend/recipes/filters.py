@@ -1,57 +1,147 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from .models import Ingredient, Recipe
+from .caching import get_catalog_mapping
+from .models import FavoriteRecipe, Ingredient, Recipe, ShoppingList, Tag
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_catalog_mapping(Tag, 'slug')]
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith',
-    )
+    name = filters.CharFilter(method='get_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    @staticmethod
+    def get_name(queryset, name, value):
+        return queryset.name_startswith(value)
+
 
 class RecipeFilter(filters.FilterSet):
     """
     Фильтры для сортировки выдачи рецептов:
-    - по тегам
+    - по тегам (?tags=slug&tags=slug, ?tags_mode=any - хотя бы один
+      из тегов, all - все теги)
+    - по автору
     - по наличию в избранном
-    - по наличию в списке покупок.
+    - по наличию в списке покупок
+    - по списку id (?ids=1,2,3) - выборка рецептов одним запросом
+    ?search= - полнотекстовый поиск по названию, ингредиентам и
+    описанию, результаты упорядочены по релевантности.
+    ?ordering=favorites|in_carts - сортировка по популярности.
+    Связи проверяются подзапросами EXISTS, поэтому рецепт с
+    несколькими тегами не дублируется и DISTINCT не нужен.
     """
+    ORDERINGS = {
+        'favorites': ('-favorites_count', '-id'),
+        'in_carts': ('-in_carts_count', '-id'),
+    }
+    TAGS_ANY = 'any'
+    TAGS_ALL = 'all'
+
     is_favorited = filters.BooleanFilter(
         method='get_favorite',
         label='favorite',
     )
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='get_tags',
         label='tags',
     )
+    tags_mode = filters.ChoiceFilter(
+        choices=((TAGS_ANY, TAGS_ANY), (TAGS_ALL, TAGS_ALL)),
+        method='get_tags_mode',
+        label='tags_mode',
+    )
+    author = filters.NumberFilter(
+        field_name='author_id',
+        label='author',
+    )
+    ids = NumberInFilter(
+        field_name='id',
+        label='ids',
+    )
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart',
         label='shopping_cart',
     )
+    search = filters.CharFilter(
+        method='get_search',
+        label='search',
+    )
+    ordering = filters.ChoiceFilter(
+        method='get_ordering',
+        choices=tuple((key, key) for key in ORDERINGS),
+        label='ordering',
+    )
 
     class Meta:
         model = Recipe
         fields = (
             'tags',
+            'tags_mode',
             'author',
+            'ids',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
+            'ordering',
         )
 
-    def get_favorite(self, queryset, name, value):
-        if value:
-            return queryset.filter(in_favorite__user=self.request.user)
-        return queryset.exclude(
-            in_favorite__user=self.request.user
+    @staticmethod
+    def filter_exists(queryset, name, subquery, value=True):
+        """
+        Полусоединение EXISTS. В Django 2.2 Exists() попадает
+        в filter() только через аннотацию.
+        """
+        return queryset.annotate(**{name: Exists(subquery)}).filter(
+            **{name: value})
+
+    def get_tags(self, queryset, name, value):
+        tag_ids = get_catalog_mapping(Tag, 'slug')
+        tag_ids = [tag_ids[slug] for slug in value if slug in tag_ids]
+        tags = Recipe.tags.through.objects.filter(recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_mode') != self.TAGS_ALL:
+            return self.filter_exists(queryset, 'filter_tags',
+                                      tags.filter(tag_id__in=tag_ids))
+        for tag_id in tag_ids:
+            queryset = self.filter_exists(queryset, f'filter_tag_{tag_id}',
+                                          tags.filter(tag_id=tag_id))
+        return queryset
+
+    @staticmethod
+    def get_tags_mode(queryset, name, value):
+        return queryset
+
+    def _user_relation(self, queryset, name, model, value):
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        return self.filter_exists(
+            queryset, name,
+            model.objects.filter(user=user, recipe=OuterRef('pk')),
+            value,
         )
 
+    def get_favorite(self, queryset, name, value):
+        return self._user_relation(queryset, 'filter_favorited',
+                                   FavoriteRecipe, value)
+
     def get_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return Recipe.objects.filter(
-                shopping_recipe__user=self.request.user
-            )
+        return self._user_relation(queryset, 'filter_in_shopping_cart',
+                                   ShoppingList, value)
+
+    @staticmethod
+    def get_search(queryset, name, value):
+        return queryset.search(value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
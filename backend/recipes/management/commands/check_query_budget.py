@@ -0,0 +1,426 @@
+import shutil
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (  # isort:skip
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag
+)
+from recipes.utils.counters import recount  # isort:skip
+from recipes.utils.search import update_search_documents  # isort:skip
+from recipes.utils.shopping_list import rebuild_shopping_items  # isort:skip
+from users.models import Follow  # isort:skip
+
+User = get_user_model()
+
+PIXEL = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAIAAAACCAIAAAD91JpzAAAAFklEQVR4nGM8kWLE'
+    'wMDAxMDAwMDAAAARKAFipiAqoAAAAABJRU5ErkJggg=='
+)
+IMAGE = f'data:image/png;base64,{PIXEL}'
+
+# Отдельный кэш, чтобы данные тестовой БД не попали в общий кэш.
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'check-query-budget',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'check-query-budget-throttle',
+    },
+}
+
+# budget - запросы при повторных вызовах, cold_budget - при первом
+# вызове с пустым кэшем (по умолчанию равен budget).
+Endpoint = namedtuple('Endpoint',
+                      ('name', 'budget', 'paged', 'call', 'cold_budget'),
+                      defaults=(None,))
+
+
+def _recipe_payload(ctx, name, ingredients=10):
+    return {
+        'name': name,
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'tags': [tag.id for tag in ctx['tags'][:2]],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 5}
+            for ingredient in ctx['ingredients'][:ingredients]
+        ],
+    }
+
+
+def _recipes_create(client, ctx):
+    return client.post('/api/recipes/',
+                       _recipe_payload(ctx, f'qb-{time.monotonic_ns()}'),
+                       format='json')
+
+
+def _recipes_update(client, ctx):
+    recipe = ctx['own_recipe']
+    return client.patch(f'/api/recipes/{recipe.id}/',
+                        _recipe_payload(ctx, recipe.name), format='json')
+
+
+def _recipes_remove_ingredients(client, ctx):
+    """
+    Рецепт с 25 ингредиентами, затем удаление 20 из них.
+    """
+    recipe = ctx['own_recipe']
+    url = f'/api/recipes/{recipe.id}/'
+    response = client.patch(url, _recipe_payload(ctx, recipe.name, 25),
+                            format='json')
+    if response.status_code >= 400:
+        return response
+    return client.patch(url, _recipe_payload(ctx, recipe.name, 5),
+                        format='json')
+
+
+def _toggle(url):
+    def call(client, ctx):
+        recipe_url = url.format(id=ctx['other_recipe'].id)
+        response = client.post(recipe_url)
+        if response.status_code >= 400:
+            return response
+        return client.delete(recipe_url)
+    return call
+
+
+def _batch_toggle(url):
+    def call(client, ctx):
+        data = {'ids': [recipe.id for recipe in ctx['batch_recipes']]}
+        response = client.post(url, data, format='json')
+        if response.status_code >= 400:
+            return response
+        return client.delete(url, data, format='json')
+    return call
+
+
+def _subscriptions_without_follows(client, ctx):
+    client = APIClient()
+    client.force_authenticate(ctx['reader'])
+    return client.get(f'/api/users/subscriptions/?limit={ctx["limit"]}'
+                      f'&recipes_limit=1')
+
+
+def _subscribe(client, ctx):
+    url = f'/api/users/{ctx["unfollowed_author"].id}/subscribe/'
+    response = client.post(url)
+    if response.status_code >= 400:
+        return response
+    return client.delete(url)
+
+
+ENDPOINTS = (
+    Endpoint('recipes-list', 6, True,
+             lambda client, ctx: client.get(
+                 f'/api/recipes/?limit={ctx["limit"]}')),
+    Endpoint('recipes-list-filtered', 6, True,
+             lambda client, ctx: client.get(
+                 f'/api/recipes/?limit={ctx["limit"]}&is_favorited=1'
+                 f'&tags={ctx["tags"][0].slug}'),
+             cold_budget=7),
+    Endpoint('recipes-search', 6, True,
+             lambda client, ctx: client.get(
+                 f'/api/recipes/?limit={ctx["limit"]}&search=рецепт ing'
+                 f'&tags={ctx["tags"][0].slug}'),
+             cold_budget=7),
+    Endpoint('recipes-list-ids', 6, False,
+             lambda client, ctx: client.get(
+                 '/api/recipes/?ids=' + ','.join(
+                     str(recipe.id) for recipe in ctx['batch_recipes']))),
+    Endpoint('recipes-detail', 5, False,
+             lambda client, ctx: client.get(
+                 f'/api/recipes/{ctx["other_recipe"].id}/')),
+    Endpoint('recipes-create', 16, False, _recipes_create,
+             cold_budget=17),
+    Endpoint('recipes-update', 13, False, _recipes_update,
+             cold_budget=18),
+    Endpoint('recipes-update-remove-ingredients', 32, False,
+             _recipes_remove_ingredients, cold_budget=33),
+    Endpoint('recipes-favorite', 12, False,
+             _toggle('/api/recipes/{id}/favorite/'),
+             cold_budget=13),
+    Endpoint('recipes-shopping-cart', 18, False,
+             _toggle('/api/recipes/{id}/shopping_cart/'),
+             cold_budget=19),
+    Endpoint('recipes-favorite-batch', 12, False,
+             _batch_toggle('/api/recipes/favorite/')),
+    Endpoint('recipes-shopping-cart-batch', 18, False,
+             _batch_toggle('/api/recipes/shopping_cart/')),
+    Endpoint('recipes-shopping-cart-summary', 1, False,
+             lambda client, ctx: client.get('/api/recipes/shopping_cart/'),
+             cold_budget=2),
+    Endpoint('recipes-download-shopping-cart', 1, False,
+             lambda client, ctx: client.get(
+                 '/api/recipes/download_shopping_cart/'),
+             cold_budget=5),
+    Endpoint('recipes-feed', 6, True,
+             lambda client, ctx: client.get(
+                 f'/api/recipes/feed/?limit={ctx["limit"]}')),
+    Endpoint('tags-list', 1, False,
+             lambda client, ctx: client.get('/api/tags/'),
+             cold_budget=2),
+    Endpoint('ingredients-list', 1, False,
+             lambda client, ctx: client.get('/api/ingredients/?name=ing'),
+             cold_budget=2),
+    Endpoint('ingredients-autocomplete', 2, False,
+             lambda client, ctx: client.get(
+                 '/api/ingredients/autocomplete/?name=ing&limit=10')),
+    Endpoint('subscriptions-list', 3, True,
+             lambda client, ctx: client.get(
+                 f'/api/users/subscriptions/?limit={ctx["limit"]}'
+                 f'&recipes_limit=3'),
+             cold_budget=4),
+    Endpoint('subscriptions-list-empty', 3, True,
+             _subscriptions_without_follows),
+    Endpoint('subscriptions-list-no-match', 3, True,
+             lambda client, ctx: client.get(
+                 f'/api/users/subscriptions/?limit={ctx["limit"]}'
+                 f'&recipes_limit=1&search=no-such-author')),
+    Endpoint('users-subscribe', 13, False, _subscribe,
+             cold_budget=14),
+)
+
+
+def seed(size):
+    """
+    Заполняет пустую тестовую БД набором данных заданного размера:
+    size рецептов, size // 5 авторов, подписки, избранное и покупки
+    пользователя viewer и пользователь reader без подписок.
+    """
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {i}', color=f'#{i:06x}', slug=f'tag-{i}')
+        for i in range(5)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'ing {i}', measurement_unit='г')
+        for i in range(max(size, 30))
+    )
+    User.objects.bulk_create(
+        User(username=f'user{i}', email=f'user{i}@example.com',
+             first_name='Имя', last_name=f'Фамилия {i}')
+        for i in range(max(size // 5, 4))
+    )
+    viewer = User.objects.create_user(username='viewer',
+                                      email='viewer@example.com',
+                                      password='viewer-password')
+    # Пользователь без подписок, избранного и покупок.
+    reader = User.objects.create_user(username='reader',
+                                      email='reader@example.com',
+                                      password='reader-password')
+    tags = list(Tag.objects.order_by('id'))
+    ingredients = list(Ingredient.objects.order_by('id'))
+    authors = list(User.objects.exclude(
+        pk__in=(viewer.pk, reader.pk)).order_by('id'))
+    Recipe.objects.bulk_create(
+        Recipe(name=f'Рецепт {i}', text='Описание', cooking_time=i % 90 + 1,
+               image='recipes/seed.png', author=authors[i % len(authors)])
+        for i in range(size)
+    )
+    recipes = list(Recipe.objects.order_by('id'))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id,
+                            tag_id=tags[(recipe.id + shift) % len(tags)].id)
+        for recipe in recipes for shift in range(2)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[
+                (recipe.id * 7 + shift) % len(ingredients)
+            ],
+            amount=shift + 1,
+        )
+        for recipe in recipes for shift in range(6)
+    )
+    FavoriteRecipe.objects.bulk_create(
+        FavoriteRecipe(user=viewer, recipe=recipe) for recipe in recipes[::2]
+    )
+    ShoppingList.objects.bulk_create(
+        ShoppingList(user=viewer, recipe=recipe) for recipe in recipes[::3]
+    )
+    Follow.objects.bulk_create(
+        Follow(user=viewer, author=author) for author in authors[1:]
+    )
+    own_recipe = Recipe.objects.create(
+        name='Рецепт viewer', text='Описание', cooking_time=5,
+        image='recipes/seed.png', author=viewer,
+    )
+    recount()
+    rebuild_shopping_items()
+    update_search_documents()
+    return {
+        'viewer': viewer,
+        'reader': reader,
+        'tags': tags,
+        'ingredients': ingredients,
+        'own_recipe': own_recipe,
+        'other_recipe': recipes[1],
+        # Рецепты вне избранного и списка покупок viewer.
+        'batch_recipes': recipes[1::6][:3],
+        'unfollowed_author': authors[0],
+    }
+
+
+def clear():
+    for model in (ShoppingList, FavoriteRecipe, RecipeIngredient, Recipe,
+                  Follow, Ingredient, Tag, User):
+        model.objects.all().delete()
+
+
+def measure(endpoints, sizes, limits, repeat):
+    """
+    Для каждого размера набора данных и страницы: первый вызов
+    эндпоинта с пустым кэшем (cold) и repeat повторных вызовов.
+    """
+    results = {endpoint.name: [] for endpoint in endpoints}
+    for size in sizes:
+        clear()
+        ctx = seed(size)
+        client = APIClient()
+        token = Token.objects.create(user=ctx['viewer'])
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        for endpoint in endpoints:
+            for limit in (limits if endpoint.paged else limits[:1]):
+                ctx['limit'] = limit
+                for cache in caches.all():
+                    cache.clear()
+                timings, counts, statuses = [], [], []
+                for _ in range(repeat + 1):
+                    start = time.perf_counter()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = endpoint.call(client, ctx)
+                    timings.append(time.perf_counter() - start)
+                    counts.append(len(queries.captured_queries))
+                    statuses.append(response.status_code)
+                results[endpoint.name].append({
+                    'size': size,
+                    'limit': limit if endpoint.paged else None,
+                    'status': max(statuses),
+                    'cold_queries': counts[0],
+                    'queries': max(counts[1:]),
+                    'cold_ms': timings[0] * 1000,
+                    'ms': statistics.median(timings[1:]) * 1000,
+                })
+    return results
+
+
+def find_failures(endpoints, results):
+    """
+    Ошибки HTTP, превышение бюджета и рост числа запросов
+    с размером страницы или набора данных.
+    """
+    failures = []
+    for endpoint in endpoints:
+        rows = results[endpoint.name]
+        budgets = {
+            'queries': endpoint.budget,
+            'cold_queries': endpoint.cold_budget or endpoint.budget,
+        }
+        for row in rows:
+            where = f'(size={row["size"]}, limit={row["limit"]})'
+            if row['status'] >= 400:
+                failures.append(
+                    f'{endpoint.name}: HTTP {row["status"]} {where}')
+            for key, budget in budgets.items():
+                if row[key] > budget:
+                    failures.append(
+                        f'{endpoint.name}: {row[key]} {key}, '
+                        f'budget {budget} {where}'
+                    )
+        for key in budgets:
+            counts = {row[key] for row in rows}
+            if len(counts) > 1:
+                failures.append(
+                    f'{endpoint.name}: {key} depend on page or '
+                    f'dataset size: {sorted(counts)}'
+                )
+    return failures
+
+
+class Command(BaseCommand):
+    """
+    Проверка бюджета SQL-запросов для публичных эндпоинтов API.
+    Создает отдельную тестовую БД, заполняет ее наборами данных
+    возрастающего размера и вызывает каждый эндпоинт.
+    Запуск:
+    python manage.py check_query_budget --sizes 20,200 --limits 2,6,24
+    Завершается с ошибкой, если число запросов превышает бюджет
+    или растет вместе с размером страницы или набора данных.
+    """
+    help = 'Check SQL query budget and timings of the API endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='20,100',
+                            help='Dataset sizes (recipes), comma separated.')
+        parser.add_argument('--limits', default='2,6,24',
+                            help='Page sizes for paginated endpoints.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of warm calls per measurement '
+                                 '(after the first, cold one).')
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help='Only check the given endpoint(s).')
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        limits = [int(limit) for limit in options['limits'].split(',')]
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not options['endpoint'] or endpoint.name in options['endpoint']
+        ]
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0,
+                                                      autoclobber=True)
+        try:
+            # Тестовая БД создается только для default: реплики
+            # отключены, все запросы считаются на одном соединении.
+            with override_settings(MEDIA_ROOT=media_root,
+                                   PRIVATE_MEDIA_ROOT=media_root,
+                                   CACHES=TEST_CACHES, DATABASE_REPLICAS=[]):
+                results = measure(endpoints, sizes, limits,
+                                  options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.report(endpoints, results)
+        failures = find_failures(endpoints, results)
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Query budget OK'))
+
+    def report(self, endpoints, results):
+        self.stdout.write(f'{"endpoint":34}{"size":>7}{"limit":>7}'
+                          f'{"status":>8}{"cold":>6}{"queries":>9}'
+                          f'{"cold ms":>9}{"ms":>8}')
+        for endpoint in endpoints:
+            for row in results[endpoint.name]:
+                self.stdout.write(
+                    f'{endpoint.name:34}{row["size"]:>7}'
+                    f'{row["limit"] or "-":>7}{row["status"]:>8}'
+                    f'{row["cold_queries"]:>6}{row["queries"]:>9}'
+                    f'{row["cold_ms"]:>9.1f}{row["ms"]:>8.1f}'
+                )
@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingList  # isort:skip
+from recipes.payloads import recipe_payloads  # isort:skip
+from recipes.renderers import FastJSONRenderer  # isort:skip
+from recipes.serializers import ShowRecipeSerializer  # isort:skip
+from recipes.utils.dataset import batched  # isort:skip
+
+User = get_user_model()
+
+# Контексты списка (вариант изображения сериализатора) и рецепта.
+CONTEXTS = ({}, {'image_variant': 'full'})
+
+
+class Command(BaseCommand):
+    """
+    Проверка совпадения быстрого пути recipe_payloads() +
+    FastJSONRenderer с ShowRecipeSerializer + JSONRenderer байт
+    в байт на рецептах текущей БД: для анонимного пользователя и
+    пользователей с избранным или списком покупок, для вариантов
+    изображения списка и страницы рецепта.
+    Запуск:
+    python manage.py check_recipe_payloads
+    python manage.py check_recipe_payloads --users 1,2 --host example.com
+    Завершается с ошибкой, если найдены расхождения.
+    """
+    help = 'Check that fast recipe payloads match ShowRecipeSerializer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default='',
+                            help='User ids, comma separated.')
+        parser.add_argument('--sample-users', type=int, default=5,
+                            help='Number of users with favorites or '
+                                 'shopping lists to check by default.')
+        parser.add_argument('--batch', type=int, default=100,
+                            help='Recipes per page.')
+        parser.add_argument('--host', default='localhost',
+                            help='Host for absolute image URLs.')
+        parser.add_argument('--examples', type=int, default=5,
+                            help='Number of mismatches to show.')
+
+    def handle(self, *args, **options):
+        if options['users']:
+            users = list(User.objects.filter(
+                pk__in=options['users'].split(',')))
+        else:
+            users = list(User.objects.filter(
+                Q(pk__in=FavoriteRecipe.objects.values('user_id'))
+                | Q(pk__in=ShoppingList.objects.values('user_id'))
+            ).order_by('id')[:options['sample_users']])
+        ids = list(Recipe.objects.values_list('id', flat=True))
+        mismatches = []
+        checked = 0
+        for user in [AnonymousUser()] + users:
+            request = Request(APIRequestFactory().get(
+                '/api/recipes/', HTTP_HOST=options['host']))
+            request.user = user
+            for extra in CONTEXTS:
+                context = dict(extra, request=request)
+                for page in batched(ids, options['batch']):
+                    mismatches += self.compare(page, context)
+                    checked += len(page)
+        for user_id, recipe_id, expected, actual in (
+                mismatches[:options['examples']]):
+            self.stdout.write(f'user_id={user_id} recipe_id={recipe_id}')
+            self.stdout.write(f'  serializer: {expected}')
+            self.stdout.write(f'  payload:    {actual}')
+        self.stdout.write(f'{checked} payloads checked, '
+                          f'{len(mismatches)} mismatched')
+        if mismatches:
+            raise CommandError('Fast recipe payloads differ from '
+                               'ShowRecipeSerializer')
+        self.stdout.write(self.style.SUCCESS('Recipe payloads OK'))
+
+    @staticmethod
+    def compare(page, context):
+        """
+        Сравнение страницы целиком, при расхождении - по рецептам.
+        """
+        user = context['request'].user
+        recipes = Recipe.objects.with_related(user).in_bulk(page)
+        recipes = [recipes[pk] for pk in page if pk in recipes]
+        expected = ShowRecipeSerializer(recipes, many=True,
+                                        context=context).data
+        actual = recipe_payloads(page, context)
+        if (JSONRenderer().render(expected)
+                == FastJSONRenderer().render(actual)):
+            return []
+        mismatches = []
+        for index, recipe in enumerate(recipes):
+            expected_json = JSONRenderer().render(
+                expected[index] if index < len(expected) else None)
+            actual_json = FastJSONRenderer().render(
+                actual[index] if index < len(actual) else None)
+            if expected_json != actual_json:
+                mismatches.append((user.pk, recipe.pk,
+                                   expected_json.decode(),
+                                   actual_json.decode()))
+        return mismatches
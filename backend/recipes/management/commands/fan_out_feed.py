@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe  # isort:skip
+from recipes.utils.dataset import batched  # isort:skip
+from recipes.utils.feed import fan_out  # isort:skip
+
+
+class Command(BaseCommand):
+    """
+    Рассылка в ленты подписчиков рецептов, созданных в обход API
+    (загрузка данных, generate_dataset, рецепты до появления ленты).
+    Запуск:
+    python manage.py fan_out_feed
+    До рассылки такие рецепты выбираются при чтении ленты.
+    """
+    help = 'Fan out recipes that are not in follower timelines yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        pending = Recipe.objects.filter(fanned_out=False).order_by(
+            'id').values_list('id', flat=True).iterator()
+        for batch in batched(pending, options['batch_size']):
+            fan_out(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Pending recipes of popular authors: '
+            f'{Recipe.objects.filter(fanned_out=False).count()}'
+        ))
@@ -1,29 +1,45 @@
-from csv import reader
+import os
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from recipes.caching import bump_catalog_version  # isort:skip
 from recipes.models import Ingredient  # isort:skip
+from recipes.utils.importers import import_rows, read_rows  # isort:skip
 
 
 class Command(BaseCommand):
     """
-    Добавляем ингредиенты из файла CSV.
+    Добавляем ингредиенты из файла CSV или JSON.
     После миграции БД запускаем командой
     python manage.py load_ingredients локально
     или
     sudo docker-compose exec backend python manage.py load_ingredients
     на удаленном сервере.
     Создает записи в модели Ingredients из списка.
+    Повторный запуск не создает дубликатов: существующие пары
+    (название, единица измерения) пропускаются.
     """
-    help = 'Load ingredients data from csv-file to DB.'
+    help = 'Load ingredients data from csv- or json-file to DB.'
 
-    def handle(self, *args, **kwargs):
-        with open(
-                'recipes/data/ingredients.csv', 'r',
-                encoding='UTF-8'
-        ) as ingredients:
-            for row in reader(ingredients):
-                if len(row) == 2:
-                    Ingredient.objects.get_or_create(
-                        name=row[0], measurement_unit=row[1],
-                    )
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'recipes', 'data',
+                                 'ingredients.csv'),
+            help='Path to a .csv (name,unit) or .json file.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        fields = ('name', 'measurement_unit')
+        result = import_rows(Ingredient, fields,
+                             read_rows(options['path'], fields),
+                             chunk_size=options['chunk_size'])
+        if result.inserted:
+            bump_catalog_version(Ingredient)
+        self.stdout.write(
+            f'Ingredients: inserted {result.inserted}, '
+            f'skipped {result.total - result.inserted}, '
+            f'elapsed {result.elapsed:.2f}s'
+        )
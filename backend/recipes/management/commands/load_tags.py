@@ -1,29 +1,43 @@
-from csv import reader
+import os
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from recipes.caching import bump_catalog_version  # isort:skip
 from recipes.models import Tag  # isort:skip
+from recipes.utils.importers import import_rows, read_rows  # isort:skip
 
 
 class Command(BaseCommand):
     """
-    Добавляем теги из файла CSV.
+    Добавляем теги из файла CSV или JSON.
     После миграции БД запускаем командой
     python manage.py load_tags локально
     или
     sudo docker-compose exec backend python manage.py load_tags
     на удаленном сервере.
     Создает записи в модели Tag из списка.
+    Повторный запуск не создает дубликатов.
     """
-    help = 'Load tags data from csv-file to DB.'
+    help = 'Load tags data from csv- or json-file to DB.'
 
-    def handle(self, *args, **kwargs):
-        with open(
-                'recipes/data/recipes_tag.csv', 'r',
-                encoding='UTF-8'
-        ) as tags:
-            for row in reader(tags):
-                if len(row) == 3:
-                    Tag.objects.get_or_create(
-                        name=row[0], color=row[1], slug=row[2],
-                    )
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'recipes', 'data',
+                                 'recipes_tag.csv'),
+            help='Path to a .csv (name,color,slug) or .json file.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        fields = ('name', 'color', 'slug')
+        result = import_rows(Tag, fields, read_rows(options['path'], fields),
+                             chunk_size=options['chunk_size'])
+        if result.inserted:
+            bump_catalog_version(Tag)
+        self.stdout.write(
+            f'Tags: inserted {result.inserted}, '
+            f'skipped {result.total - result.inserted}, '
+            f'elapsed {result.elapsed:.2f}s'
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe  # isort:skip
+from recipes.utils.dataset import batched  # isort:skip
+from recipes.utils.search import update_search_documents  # isort:skip
+
+
+class Command(BaseCommand):
+    """
+    Пересчет поисковых документов рецептов пачками: после загрузки
+    данных в обход API или изменения SEARCH_CONFIG.
+    Запуск:
+    python manage.py rebuild_search
+    """
+    help = 'Rebuild full-text search documents of recipes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        ids = Recipe.objects.order_by('id').values_list(
+            'id', flat=True).iterator()
+        total = 0
+        for batch in batched(ids, options['batch_size']):
+            update_search_documents(Recipe.objects.filter(pk__in=batch))
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Search documents rebuilt: {total}'))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.utils.counters import COUNTERS, find_drift, recount  # isort:skip
+from recipes.utils.shopping_list import (  # isort:skip
+    find_shopping_items_drift,
+    rebuild_shopping_items
+)
+
+
+class Command(BaseCommand):
+    """
+    Пересчет денормализованных счетчиков: избранное и списки покупок
+    рецептов, использование ингредиентов, рецепты и подписчики авторов,
+    сводные списки покупок.
+    Запуск:
+    python manage.py recount
+    python manage.py recount --check
+    С --check счетчики не изменяются: команда выводит число записей
+    с расхождением и завершается с ошибкой, если оно найдено.
+    """
+    help = 'Rebuild denormalized counters or check them for drift.'
+    ITEMS_LABEL = 'recipes.ShoppingListItem'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drifted counters.')
+        parser.add_argument('--examples', type=int, default=5,
+                            help='Number of drifted rows to show.')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            for counter, updated in recount().items():
+                self.stdout.write(f'{self._label(counter)}: {updated}')
+            self.stdout.write(
+                f'{self.ITEMS_LABEL}: {rebuild_shopping_items()}')
+            self.stdout.write(self.style.SUCCESS('Counters rebuilt'))
+            return
+        drifted = 0
+        for counter in COUNTERS:
+            queryset = find_drift(counter)
+            count = queryset.count()
+            drifted += count
+            self.stdout.write(f'{self._label(counter)}: {count} drifted')
+            for pk, stored, actual in queryset.values_list(
+                    'pk', counter.field, 'actual')[:options['examples']]:
+                self.stdout.write(f'  pk={pk}: {stored} != {actual}')
+        users = find_shopping_items_drift()
+        drifted += len(users)
+        self.stdout.write(f'{self.ITEMS_LABEL}: {len(users)} users drifted')
+        for user_id in users[:options['examples']]:
+            self.stdout.write(f'  user_id={user_id}')
+        if drifted:
+            raise CommandError(
+                f'{drifted} counters drifted, run "manage.py recount"'
+            )
+        self.stdout.write(self.style.SUCCESS('Counters OK'))
+
+    @staticmethod
+    def _label(counter):
+        return f'{counter.model._meta.label}.{counter.field}'
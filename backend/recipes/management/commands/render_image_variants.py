@@ -0,0 +1,85 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+
+from recipes.models import Recipe  # isort:skip
+from recipes.utils.bulk import claim_rows  # isort:skip
+from recipes.utils.images import render_image_variants  # isort:skip
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Фоновая подготовка превью и WebP-вариантов изображений рецептов.
+    Запускается отдельным процессом (сервис image_worker в
+    docker-compose):
+    python manage.py render_image_variants
+    Варианты сохраняются рядом с оригиналом, после обработки
+    увеличивается версия рецепта, чтобы сбросить ETag.
+    """
+    help = 'Render thumbnails and WebP variants of recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process pending images and exit.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Polling interval in seconds.')
+        parser.add_argument('--batch-size', type=int, default=10)
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Queue failed images again.')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            Recipe.objects.filter(image_status=Recipe.IMAGE_FAILED).update(
+                image_status=Recipe.IMAGE_PENDING)
+        while True:
+            processed = self.process(options['batch_size'])
+            if options['once'] and not processed:
+                return
+            if not processed:
+                time.sleep(options['interval'])
+
+    @staticmethod
+    def process(batch_size):
+        """
+        Изображения помечаются как processing в короткой транзакции
+        и обрабатываются вне ее: счетчики и правки рецептов не ждут
+        рендеринга. Статус записывается, только если изображение
+        не заменили и запись не взял другой процесс.
+        """
+        claimed_at = timezone.now()
+        stale = claimed_at - timedelta(
+            seconds=settings.BACKGROUND_CLAIM_TIMEOUT)
+        ids = claim_rows(
+            Recipe.objects.filter(
+                Q(image_status=Recipe.IMAGE_PENDING)
+                | Q(image_status=Recipe.IMAGE_PROCESSING,
+                    image_claimed_at__lt=stale)
+            ).order_by('id'),
+            batch_size,
+            image_status=Recipe.IMAGE_PROCESSING,
+            image_claimed_at=claimed_at,
+        )
+        for recipe in Recipe.objects.filter(pk__in=ids).only('id', 'image'):
+            try:
+                render_image_variants(recipe.image)
+                image_status = Recipe.IMAGE_READY
+            except Exception:
+                logger.exception('Failed to render %s', recipe.image)
+                image_status = Recipe.IMAGE_FAILED
+            Recipe.objects.filter(
+                pk=recipe.pk, image=recipe.image.name,
+                image_status=Recipe.IMAGE_PROCESSING,
+                image_claimed_at=claimed_at,
+            ).update(
+                image_status=image_status,
+                updated_at=timezone.now(),
+                version=F('version') + 1,
+            )
+        return len(ids)
@@ -0,0 +1,83 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import ShoppingListPdf  # isort:skip
+from recipes.utils.bulk import claim_rows  # isort:skip
+from recipes.utils.shopping_list import render_shopping_list_pdf  # isort:skip
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Фоновый рендеринг PDF со списками покупок.
+    Запускается отдельным процессом (сервис worker в docker-compose):
+    python manage.py render_shopping_lists
+    Веб-воркеры только ставят задания, WeasyPrint работает здесь.
+    Неудачные задания получают статус failed; повторно их ставит
+    в очередь get_shopping_list_pdf с задержкой (retry_delay).
+    Старые файлы удаляются через SHOPPING_LIST_PDF_MAX_AGE секунд.
+    """
+    help = 'Render pending shopping list PDFs in the background.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Process pending jobs and exit.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Polling interval in seconds.')
+        parser.add_argument('--batch-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        while True:
+            processed = self.process(options['batch_size'])
+            self.purge()
+            if options['once'] and not processed:
+                return
+            if not processed:
+                time.sleep(options['interval'])
+
+    @staticmethod
+    def process(batch_size):
+        """
+        Задания помечаются как rendering в короткой транзакции,
+        WeasyPrint работает вне ее.
+        """
+        claimed_at = timezone.now()
+        stale = claimed_at - timedelta(
+            seconds=settings.BACKGROUND_CLAIM_TIMEOUT)
+        ids = claim_rows(
+            ShoppingListPdf.objects.filter(
+                Q(status=ShoppingListPdf.PENDING)
+                | Q(status=ShoppingListPdf.RENDERING, claimed_at__lt=stale)
+            ),
+            batch_size,
+            status=ShoppingListPdf.RENDERING,
+            claimed_at=claimed_at,
+        )
+        for job in ShoppingListPdf.objects.filter(pk__in=ids):
+            try:
+                render_shopping_list_pdf(job)
+            except Exception:
+                logger.exception('Failed to render %s', job.digest)
+                job.status = ShoppingListPdf.FAILED
+                job.attempts += 1
+                job.failed_at = timezone.now()
+                job.save(update_fields=('status', 'attempts', 'failed_at'))
+        return len(ids)
+
+    @staticmethod
+    def purge():
+        expired = ShoppingListPdf.objects.filter(
+            created__lt=timezone.now() - timedelta(
+                seconds=settings.SHOPPING_LIST_PDF_MAX_AGE),
+        )
+        for pdf in expired:
+            if pdf.file:
+                pdf.file.delete(save=False)
+            pdf.delete()
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.19 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_auto_20220427_0237'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListPdf',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='Хэш списка')),
+                ('ingredients', models.TextField(verbose_name='Позиции списка')),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('ready', 'ready'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='Статус')),
+                ('file', models.FileField(blank=True, storage=recipes.storage.PrivateStorage(), upload_to='shopping_lists/', verbose_name='Файл')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'PDF списка покупок',
+                'verbose_name_plural': 'PDF списков покупок',
+                'ordering': ('created',),
+            },
+        ),
+    ]
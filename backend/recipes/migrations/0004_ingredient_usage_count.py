@@ -0,0 +1,81 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+import recipes.fields
+
+# Индексы, которые нельзя описать через models.Index:
+# (создание, удаление при откате).
+INDEXES = {
+    'postgresql': (
+        (
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            None,
+        ),
+        (
+            'CREATE INDEX ingredient_name_lower_trgm '
+            'ON recipes_ingredient USING gin (name_lower gin_trgm_ops)',
+            'DROP INDEX IF EXISTS ingredient_name_lower_trgm',
+        ),
+    ),
+}
+
+
+def create_indexes(apps, schema_editor):
+    for sql, _ in INDEXES.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    for _, sql in INDEXES.get(schema_editor.connection.vendor, ()):
+        if sql:
+            schema_editor.execute(sql)
+
+
+def count_usage(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    usage = RecipeIngredient.objects.filter(
+        ingredient=OuterRef('pk'),
+    ).order_by().values('ingredient').annotate(count=Count('id'))
+    Ingredient.objects.update(usage_count=Coalesce(
+        Subquery(usage.values('count'), output_field=models.IntegerField()),
+        0,
+    ))
+
+
+def fill_name_lower(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    ingredients = list(Ingredient.objects.only('id', 'name'))
+    for ingredient in ingredients:
+        ingredient.name_lower = ingredient.name.lower()
+    Ingredient.objects.bulk_update(ingredients, ('name_lower',),
+                                   batch_size=300)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shopping_list_pdf'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Использований в рецептах'),
+        ),
+        migrations.RunPython(count_usage, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='ingredient',
+            name='name_lower',
+            field=recipes.fields.LowercaseField(default='', editable=False, max_length=200, source='name', verbose_name='Название в нижнем регистре'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_name_lower, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name_lower'], name='ingredient_name_lower_idx', opclasses=('text_pattern_ops',)),
+        ),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
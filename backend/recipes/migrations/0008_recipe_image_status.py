@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_author_latest_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('ready', 'ready'), ('failed', 'failed')], db_index=True, default='pending', editable=False, max_length=10, verbose_name='Статус обработки изображения'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 2.2.19 on 2026-10-18 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_items(apps, schema_editor):
+    shopping_list = apps.get_model('recipes', 'ShoppingList')
+    item = apps.get_model('recipes', 'ShoppingListItem')
+    rows = shopping_list.objects.filter(
+        recipe__recipe_ingredient__isnull=False,
+    ).values('user_id', 'recipe__recipe_ingredient__ingredient_id').annotate(
+        total=Sum('recipe__recipe_ingredient__amount'),
+    ).values_list(
+        'user_id', 'recipe__recipe_ingredient__ingredient_id', 'total',
+    ).order_by()
+    item.objects.bulk_create(
+        (item(user_id=user_id, ingredient_id=ingredient_id, amount=amount)
+         for user_id, ingredient_id, amount in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0010_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.Ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_items', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Сводные списки покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_item'),
+        ),
+        migrations.RunPython(fill_items, migrations.RunPython.noop),
+    ]
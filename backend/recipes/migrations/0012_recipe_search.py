@@ -0,0 +1,81 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:07
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+INGREDIENT_NAMES = (
+    'SELECT {aggregate} '
+    'FROM recipes_recipeingredient item '
+    'JOIN recipes_ingredient ingredient ON ingredient.id = item.ingredient_id '
+    'WHERE item.recipe_id = recipe.id'
+)
+SQL = {
+    'postgresql': (
+        (
+            'CREATE INDEX recipe_search_idx ON recipes_recipe '
+            'USING gin (search_vector)',
+            'DROP INDEX IF EXISTS recipe_search_idx',
+        ),
+        (
+            'UPDATE recipes_recipe recipe SET search_vector = '
+            "setweight(to_tsvector(%s::regconfig, recipe.name), 'A')"
+            " || setweight(to_tsvector(%s::regconfig, coalesce(("
+            + INGREDIENT_NAMES.format(
+                aggregate="string_agg(ingredient.name, ' ')")
+            + "), '')), 'B') || setweight(to_tsvector("
+            "%s::regconfig, recipe.text), 'C')",
+            None,
+        ),
+    ),
+    'sqlite': (
+        (
+            'CREATE VIRTUAL TABLE recipes_recipe_search USING fts5('
+            "name, ingredients, text, tokenize='unicode61 remove_diacritics 2'"
+            ", prefix='2 3')",
+            'DROP TABLE IF EXISTS recipes_recipe_search',
+        ),
+        (
+            # Ранжирование по bm25 с весами столбцов.
+            'INSERT INTO recipes_recipe_search (recipes_recipe_search, rank) '
+            "VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')",
+            None,
+        ),
+        (
+            'INSERT INTO recipes_recipe_search '
+            '(rowid, name, ingredients, text) '
+            'SELECT recipe.id, recipe.name, ('
+            + INGREDIENT_NAMES.format(
+                aggregate="group_concat(ingredient.name, ' ')")
+            + '), recipe.text FROM recipes_recipe recipe',
+            None,
+        ),
+    ),
+}
+
+
+def create_search(apps, schema_editor):
+    for sql, _ in SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql, (settings.SEARCH_CONFIG,) * sql.count('%s'))
+
+
+def drop_search(apps, schema_editor):
+    for _, sql in SQL.get(schema_editor.connection.vendor, ()):
+        if sql:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_shopping_list_item'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый документ'),
+        ),
+        migrations.RunPython(create_search, drop_search),
+    ]
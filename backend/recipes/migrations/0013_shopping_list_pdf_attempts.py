@@ -0,0 +1,23 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglistpdf',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных попыток'),
+        ),
+        migrations.AddField(
+            model_name='shoppinglistpdf',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время последней ошибки'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_shopping_list_pdf_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'pending'), ('processing', 'processing'), ('ready', 'ready'), ('failed', 'failed')], db_index=True, default='pending', editable=False, max_length=10, verbose_name='Статус обработки изображения'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_claimed_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Взято в обработку'),
+        ),
+        migrations.AlterField(
+            model_name='shoppinglistpdf',
+            name='status',
+            field=models.CharField(choices=[('pending', 'pending'), ('rendering', 'rendering'), ('ready', 'ready'), ('failed', 'failed')], default='pending', max_length=10, verbose_name='Статус'),
+        ),
+        migrations.AddField(
+            model_name='shoppinglistpdf',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взято в обработку'),
+        ),
+    ]
@@ -1,12 +1,26 @@
+import re
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import Exists, F, Func, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from .fields import HexColorField
+from .fields import HexColorField, LowercaseField
+from .storage import PrivateStorage
 
 User = get_user_model()
 
+# Таблица FTS5 с поисковыми документами рецептов на SQLite
+# (rowid - id рецепта).
+SEARCH_TABLE = 'recipes_recipe_search'
+SEARCH_MAX_TERMS = 8
+
 
 class Tag(models.Model):
     """
@@ -43,11 +57,49 @@ class Tag(models.Model):
         return self.name
 
 
+class IngredientQuerySet(models.QuerySet):
+    """
+    Поиск ингредиентов по колонке name_lower.
+    """
+
+    def name_startswith(self, term):
+        """
+        Префиксный поиск без учета регистра. Диапазонное условие
+        позволяет SQLite использовать индекс по name_lower,
+        на PostgreSQL используется индекс text_pattern_ops.
+        """
+        term = term.lower()
+        return self.filter(
+            name_lower__startswith=term,
+            name_lower__gte=term,
+            name_lower__lt=term + '\U0010ffff',
+        )
+
+    def autocomplete(self, term, limit):
+        """
+        Подсказки для редактора рецептов: сначала совпадения
+        по началу названия, затем по вхождению; внутри групп -
+        по частоте использования в рецептах.
+        """
+        order = ('-usage_count', 'name')
+        result = list(self.name_startswith(term).order_by(*order)[:limit])
+        if len(result) < limit:
+            # Все совпадения по началу названия уже выбраны.
+            result += list(
+                self.filter(name_lower__contains=term.lower())
+                .exclude(id__in=[item.id for item in result])
+                .order_by(*order)[:limit - len(result)]
+            )
+        return result
+
+
 class Ingredient(models.Model):
     """
     Модель ингредиентов.
     name - название ингредиента
-    measurement_unit - единица измерения.
+    measurement_unit - единица измерения
+    usage_count - число рецептов с ингредиентом
+    name_lower - название в нижнем регистре для поиска.
     """
     name = models.CharField(
         verbose_name=_('Название'),
@@ -61,6 +113,18 @@ class Ingredient(models.Model):
         blank=False,
         help_text='Выберите единицу измерения',
     )
+    usage_count = models.PositiveIntegerField(
+        verbose_name=_('Использований в рецептах'),
+        default=0,
+        editable=False,
+    )
+    name_lower = LowercaseField(
+        verbose_name=_('Название в нижнем регистре'),
+        source='name',
+        max_length=200,
+    )
+
+    objects = IngredientQuerySet.as_manager()
 
     class Meta:
         constraints = (
@@ -68,6 +132,11 @@ class Ingredient(models.Model):
                 fields=('name', 'measurement_unit'),
                 name='pair_unique'),
         )
+        indexes = (
+            models.Index(fields=('name_lower',),
+                         name='ingredient_name_lower_idx',
+                         opclasses=('text_pattern_ops',)),
+        )
         ordering = ('-id',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
@@ -76,6 +145,173 @@ class Ingredient(models.Model):
         return f'{self.name}'
 
 
+class FTSMatch(Func):
+    """
+    id рецепта входит в совпадения запроса match в таблице FTS5
+    SEARCH_TABLE (SQLite).
+    """
+    template = (f'(%(expressions)s IN (SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %%s))')
+
+    def __init__(self, match):
+        super().__init__(F('pk'), output_field=models.BooleanField())
+        self.match = match
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, (*params, self.match)
+
+
+class RecipeQuerySet(models.QuerySet):
+    """
+    Выборка рецептов с данными для сериализатора ShowRecipeSerializer.
+    """
+    VALIDATOR_FIELDS = (
+        'id', 'version', 'updated_at', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+
+    def with_flags(self, user=None):
+        """
+        Флаги избранного и списка покупок для текущего пользователя
+        (подзапросы Exists()).
+        """
+        if user is None or not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def with_related(self, user=None):
+        """
+        Подгружает теги, ингредиенты и автора фиксированным числом
+        запросов и аннотирует флаги избранного, списка покупок и
+        подписки на автора для текущего пользователя.
+        """
+        from users.models import Follow
+
+        authors = User.objects.all()
+        if user is not None and user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return self.with_flags(user).prefetch_related(
+            'tags',
+            Prefetch('author', queryset=authors),
+            Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient').order_by('id'),
+            ),
+        )
+
+    def with_user_flags(self, user=None):
+        """
+        Флаги избранного и списка покупок и подписка на автора
+        рецепта для выборок values().
+        """
+        from users.models import Follow
+
+        if user is None or not user.is_authenticated:
+            return self
+        return self.with_flags(user).annotate(
+            is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def validators(self, user=None):
+        """
+        Данные для ETag/Last-Modified одним запросом без загрузки
+        моделей: версия рецепта, поля автора и флаги пользователя.
+        """
+        fields = self.VALIDATOR_FIELDS
+        if user is not None and user.is_authenticated:
+            fields += ('is_favorited', 'is_in_shopping_cart',
+                       'is_subscribed')
+        return self.with_user_flags(user).values(*fields)
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию, ингредиентам и описанию:
+        рецепт должен содержать все слова запроса (как начала слов).
+        Ранжируются только SEARCH_MAX_RESULTS новейших совпадений
+        (с учетом остальных фильтров): время ответа не зависит от
+        числа рецептов с частым словом. Результаты упорядочены
+        по релевантности (search_rank), совпадение в названии весит
+        больше, чем в ингредиентах и описании.
+        """
+        terms = re.findall(r'[^\W_]+', query.lower())[:SEARCH_MAX_TERMS]
+        if not terms:
+            return self
+        if connections[self.db].vendor == 'postgresql':
+            search = SearchQuery(
+                ' & '.join(f'{term}:*' for term in terms),
+                config=settings.SEARCH_CONFIG,
+                search_type='raw',
+            )
+            newest = self.filter(search_vector=search)
+            ranked = self.annotate(
+                search_rank=SearchRank(F('search_vector'), search))
+        else:
+            match = ' '.join(f'"{term}"*' for term in terms)
+            newest = self.annotate(search_match=FTSMatch(match)).filter(
+                search_match=True)
+            # Соединение с таблицей FTS5: bm25 вычисляется за один
+            # проход по совпадениям (коррелированный подзапрос с MATCH
+            # повторял бы поиск для каждого рецепта). У bm25 меньше -
+            # лучше.
+            table = self.model._meta.db_table
+            ranked = self.extra(
+                select={'search_rank': f'-{SEARCH_TABLE}.rank'},
+                tables=[SEARCH_TABLE],
+                where=[f'{SEARCH_TABLE} MATCH %s',
+                       f'{SEARCH_TABLE}.rowid = {table}.id'],
+                params=[match],
+            )
+        newest = newest.order_by('-id').values('pk')[
+            :settings.SEARCH_MAX_RESULTS]
+        return ranked.filter(pk__in=newest).order_by('-search_rank', '-id')
+
+    def touch(self):
+        """
+        Отметка об изменении связанных данных рецептов
+        (ингредиенты, теги).
+        """
+        return self.update(updated_at=timezone.now(),
+                           version=F('version') + 1)
+
+    def latest_by_author(self, author_ids, limit=None):
+        """
+        Последние limit рецептов каждого из авторов одним запросом:
+        рецепты нумеруются оконной функцией ROW_NUMBER() в пределах
+        автора. Возвращает словарь {author_id: [рецепты]}.
+        """
+        if not author_ids:
+            # Для пустого IN Django не строит SQL (EmptyResultSet).
+            return {}
+        queryset = self.filter(author_id__in=author_ids).order_by()
+        result = {author_id: [] for author_id in author_ids}
+        if limit is None:
+            recipes = queryset.order_by('author_id', '-id')
+        else:
+            sql, params = queryset.annotate(recipe_rank=Window(
+                RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=F('id').desc(),
+            )).query.sql_with_params()
+            recipes = self.model.objects.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s '
+                f'ORDER BY author_id, recipe_rank',
+                (*params, limit),
+            )
+        for recipe in recipes:
+            result[recipe.author_id].append(recipe)
+        return result
+
+
 class Recipe(models.Model):
     """
     Модель рецептов.
@@ -85,8 +321,38 @@ class Recipe(models.Model):
     tags - теги
     ingredients - ингредиенты
     image - картинка
-    cooking_time - время приготовления.
+    cooking_time - время приготовления
+    updated_at - время последнего изменения
+    version - номер версии, увеличивается при каждом изменении
+    рецепта, его ингредиентов или тегов
+    favorites_count - число добавлений в избранное
+    in_carts_count - число добавлений в списки покупок
+    image_status - готовность производных изображений (превью, WebP)
+    image_claimed_at - когда изображение взял в обработку фоновый
+    процесс (status processing)
+    fanned_out - рецепт разослан в ленты подписчиков автора; остальные
+    рецепты попадают в ленту при чтении (pull-on-read).
+    search_vector - поисковый документ на PostgreSQL (на SQLite -
+    таблица FTS5 SEARCH_TABLE).
     """
+    IMAGE_PENDING = 'pending'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'pending'),
+        (IMAGE_PROCESSING, 'processing'),
+        (IMAGE_READY, 'ready'),
+        (IMAGE_FAILED, 'failed'),
+    )
+    # Колонки, которые меняются запросами UPDATE в обход save():
+    # счетчики, фоновые процессы, поиск. save() существующего рецепта
+    # их не записывает, иначе параллельные изменения затирались бы
+    # загруженными значениями; image_status сбрасывается в pending,
+    # только если сменилось изображение.
+    UPDATE_ONLY_FIELDS = ('favorites_count', 'in_carts_count',
+                          'image_status', 'image_claimed_at', 'fanned_out',
+                          'search_vector')
     name = models.CharField(
         verbose_name=_('Название'),
         max_length=200,
@@ -126,8 +392,63 @@ class Recipe(models.Model):
         verbose_name=_('Время приготовления'),
         help_text='Задайте время приготовления блюда',
     )
+    updated_at = models.DateTimeField(
+        verbose_name=_('Дата изменения'),
+        auto_now=True,
+    )
+    version = models.PositiveIntegerField(
+        verbose_name=_('Версия'),
+        default=1,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name=_('Количество добавлений в избранное'),
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name=_('Количество добавлений в списки покупок'),
+        default=0,
+        editable=False,
+    )
+    image_status = models.CharField(
+        verbose_name=_('Статус обработки изображения'),
+        max_length=10,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_PENDING,
+        editable=False,
+        db_index=True,
+    )
+    image_claimed_at = models.DateTimeField(
+        verbose_name=_('Взято в обработку'),
+        null=True,
+        editable=False,
+    )
+    fanned_out = models.BooleanField(
+        verbose_name=_('Разослан в ленты подписчиков'),
+        default=False,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name=_('Поисковый документ'),
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
+        indexes = (
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_popularity_idx'),
+            models.Index(fields=('-in_carts_count', '-id'),
+                         name='recipe_in_carts_idx'),
+            models.Index(fields=('author', '-id'),
+                         name='recipe_author_latest_idx'),
+            models.Index(fields=('author', '-id'),
+                         name='recipe_pull_feed_idx',
+                         condition=models.Q(fanned_out=False)),
+        )
         ordering = ('-id',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
@@ -135,6 +456,35 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        if 'image' in recipe.__dict__:
+            recipe._saved_image = recipe._image_name()
+        return recipe
+
+    def _image_name(self):
+        image = self.__dict__.get('image')
+        return getattr(image, 'name', image)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            self.version += 1
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname in self.__dict__
+                and field.name not in self.UPDATE_ONLY_FIELDS
+            ]
+            if ('image' in self.__dict__ and hasattr(self, '_saved_image')
+                    and self._image_name() != self._saved_image):
+                self.image_status = self.IMAGE_PENDING
+                kwargs['update_fields'].append('image_status')
+        super().save(*args, **kwargs)
+        if 'image' in self.__dict__:
+            self._saved_image = self._image_name()
+
 
 class RecipeIngredient(models.Model):
     """
@@ -206,6 +556,10 @@ class FavoriteRecipe(models.Model):
                 name='unique_favorite',
             ),
         )
+        indexes = (
+            models.Index(fields=('user', 'recipe'),
+                         name='favorite_user_recipe_idx'),
+        )
         ordering = ('-id',)
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные рецепты'
@@ -240,9 +594,162 @@ class ShoppingList(models.Model):
                 name='shopping_recipe_user_exists',
             ),
         )
+        indexes = (
+            models.Index(fields=('user', 'recipe'),
+                         name='shopping_user_recipe_idx'),
+        )
         ordering = ('-id',)
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
 
     def __str__(self):
         return f'Рецепт {self.recipe} у пользователя {self.user}'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Сводный список покупок: сумма ингредиента по всем рецептам
+    в списке покупок пользователя. Обновляется приращениями при
+    добавлении и удалении рецептов из списка и при изменении
+    ингредиентов рецептов (utils.shopping_list).
+    user - пользователь
+    ingredient - ингредиент (с единицей измерения)
+    amount - суммарное количество.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name=_('Пользователь'),
+        related_name='shopping_items',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name=_('Ингредиент'),
+        related_name='+',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name=_('Количество'),
+        default=0,
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_item',
+            ),
+        )
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} – {self.amount} у пользователя {self.user}'
+
+
+class FeedEntry(models.Model):
+    """
+    Запись материализованной ленты подписок: рецепт recipe автора
+    author в ленте пользователя user. Добавляется при публикации
+    рецепта (fan-out on write) и при подписке на автора.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name=_('Пользователь'),
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name=_('Рецепт'),
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Автор'),
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} в ленте {self.user_id}'
+
+
+class ShoppingListPdf(models.Model):
+    """
+    Отрендеренный PDF со списком покупок.
+    digest - хэш содержимого списка (одинаковые списки разных
+    пользователей используют один файл)
+    ingredients - список позиций в JSON для фонового рендеринга
+    status - состояние рендеринга
+    file - готовый файл (в PRIVATE_MEDIA_ROOT, отдается только через API)
+    attempts - число неудачных попыток рендеринга
+    failed_at - время последней неудачной попытки
+    claimed_at - когда задание взял фоновый процесс (status rendering).
+    """
+    PENDING = 'pending'
+    RENDERING = 'rendering'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'pending'),
+        (RENDERING, 'rendering'),
+        (READY, 'ready'),
+        (FAILED, 'failed'),
+    )
+    digest = models.CharField(
+        verbose_name=_('Хэш списка'),
+        max_length=64,
+        unique=True,
+    )
+    ingredients = models.TextField(verbose_name=_('Позиции списка'))
+    status = models.CharField(
+        verbose_name=_('Статус'),
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    file = models.FileField(
+        verbose_name=_('Файл'),
+        upload_to='shopping_lists/',
+        storage=PrivateStorage(),
+        blank=True,
+    )
+    created = models.DateTimeField(
+        verbose_name=_('Дата создания'),
+        auto_now_add=True,
+        db_index=True,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name=_('Неудачных попыток'),
+        default=0,
+    )
+    failed_at = models.DateTimeField(
+        verbose_name=_('Время последней ошибки'),
+        null=True,
+        blank=True,
+    )
+    claimed_at = models.DateTimeField(
+        verbose_name=_('Взято в обработку'),
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'PDF списка покупок'
+        verbose_name_plural = 'PDF списков покупок'
+
+    def __str__(self):
+        return f'{self.digest} ({self.status})'
@@ -0,0 +1,283 @@
+import base64
+import binascii
+import json
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import UnidentifiedImageError
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+
+from .utils.images import check_image_pixels, check_image_size
+
+CHUNK_SIZE = 64 * 1024
+# Размеры декодированных данных, на которых проверяется заголовок
+# изображения (EXIF с превью может отодвинуть размеры JPEG).
+HEADER_PROBES = (64 * 1024, 256 * 1024, 1024 * 1024)
+STRING_SPECIAL = re.compile(rb'["\\]')
+VALUE_ESCAPES = {b'/': b'/', b'n': b'', b'r': b''}
+
+
+def _find_string_end(data, escaped=False):
+    """
+    Поиск закрывающей кавычки JSON-строки в очередной порции данных
+    с учетом экранирования. escaped - предыдущая порция закончилась
+    обратной косой чертой. Возвращает (позиция кавычки или None,
+    признак того, что порция закончилась обратной косой чертой).
+    """
+    pos = 1 if escaped else 0
+    while True:
+        match = STRING_SPECIAL.search(data, pos)
+        if match is None:
+            return None, False
+        if match.group() == b'"':
+            return match.start(), False
+        if match.end() >= len(data):
+            return None, True
+        pos = match.end() + 1
+
+
+class _KeyScanner:
+    """
+    Поиск начала строкового значения ключа верхнего уровня
+    в JSON, поступающем частями. Структурные символы JSON - ASCII,
+    поэтому разбор идет по байтам без декодирования UTF-8.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.depth = 0
+        self.in_string = False
+        self.string_start = None
+        self.expect = None
+        self.last_key = None
+
+    def scan(self, buffer, pos):
+        """
+        Возвращает (позиция открывающей кавычки значения или None,
+        позиция, с которой продолжить разбор).
+        """
+        size = len(buffer)
+        while pos < size:
+            if self.in_string:
+                pos, complete = self._skip_string(buffer, pos)
+                if not complete:
+                    return None, pos
+                continue
+            char = buffer[pos:pos + 1]
+            if char == b'"':
+                if (self.depth == 1 and self.expect == 'value'
+                        and self.last_key == self.key):
+                    return pos, pos + 1
+                self.in_string = True
+                self.string_start = (
+                    pos + 1 if self.depth == 1 and self.expect == 'key'
+                    else None
+                )
+            else:
+                self._structure(char)
+            pos += 1
+        return None, pos
+
+    def _skip_string(self, buffer, pos):
+        """
+        Пропуск содержимого строки. Возвращает (позиция, признак
+        того, что буфера хватило для продолжения разбора).
+        """
+        match = STRING_SPECIAL.search(buffer, pos)
+        if match is None:
+            return len(buffer), False
+        if match.group() == b'\\':
+            if match.end() >= len(buffer):
+                return match.start(), False
+            return match.end() + 1, True
+        if self.string_start is not None:
+            self.last_key = buffer[self.string_start:match.start()]
+            self.expect = 'colon'
+        self.in_string = False
+        return match.end(), True
+
+    def _structure(self, char):
+        if char in (b'{', b'['):
+            self.depth += 1
+            if self.depth == 1:
+                self.expect = 'key' if char == b'{' else None
+        elif char in (b'}', b']'):
+            self.depth -= 1
+        elif self.depth == 1 and char == b':':
+            self.expect = 'value'
+        elif self.depth == 1 and char == b',':
+            self.expect = 'key'
+            self.last_key = None
+
+
+class _Base64Writer:
+    """
+    Принимает содержимое JSON-строки порциями. Data URI с base64
+    декодируется во временный файл с проверкой лимитов по мере
+    поступления данных, другие строки (например, ссылка на текущее
+    изображение) собираются без изменений и разбираются json.loads.
+    """
+    PREFIX = b'data:'
+
+    def __init__(self):
+        self.original = b''
+        self.head = b''
+        self.raw = None
+        self.file = None
+        self.pending = b''
+        self.escape = False
+        self.size = 0
+        self.probes = list(HEADER_PROBES)
+
+    def write(self, data):
+        if self.raw is not None:
+            self.raw += data
+            if len(self.raw) > settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+                raise ParseError('Слишком большой запрос')
+            return
+        if self.file is None:
+            self.original += data
+            if not self.PREFIX.startswith(self.original[:len(self.PREFIX)]):
+                self.raw = self.original
+                return
+        data = self._unescape(data)
+        if self.file is None:
+            self.head += data
+            if b',' not in self.head:
+                if len(self.head) > 256:
+                    raise ParseError('Некорректный data URI изображения')
+                return
+            header, data = self.head.split(b',', 1)
+            if not header.endswith(b';base64'):
+                raise ParseError('Ожидается изображение в base64')
+            content_type = header[len(self.PREFIX):].split(b';')[0]
+            content_type = content_type.decode('ascii', 'replace')
+            self.file = TemporaryUploadedFile(
+                f'{uuid.uuid4()}.{content_type.split("/")[-1]}',
+                content_type, 0, None,
+            )
+        self.pending += data
+        self._decode(len(self.pending) // 4 * 4)
+
+    def close(self):
+        if self.file is None:
+            raw = self.original if self.raw is None else self.raw
+            return json.loads(b'"' + raw + b'"')
+        self._decode(len(self.pending))
+        if self.probes:
+            self._check_header(final=True)
+        self.file.seek(0)
+        self.file.size = self.size
+        return self.file
+
+    def _unescape(self, data):
+        """
+        В base64 допустимы только экранированные / и переводы строк.
+        """
+        if self.escape:
+            data, self.escape = b'\\' + data, False
+        if b'\\' not in data:
+            return data
+        parts = data.split(b'\\')
+        if not parts[-1]:
+            self.escape = True
+            parts.pop()
+        result = [parts[0]]
+        for part in parts[1:]:
+            if part[:1] not in VALUE_ESCAPES:
+                raise ParseError('Недопустимый символ в base64')
+            result.append(VALUE_ESCAPES[part[:1]] + part[1:])
+        return b''.join(result)
+
+    def _decode(self, length):
+        if not length:
+            return
+        chunk, self.pending = self.pending[:length], self.pending[length:]
+        try:
+            decoded = base64.b64decode(chunk, validate=True)
+        except binascii.Error:
+            self.file.close()
+            raise ParseError('Некорректные данные base64')
+        self.size += len(decoded)
+        try:
+            check_image_size(self.size)
+        except ValidationError as exc:
+            self.file.close()
+            raise ValidationError({'image': exc.detail})
+        self.file.write(decoded)
+        if self.probes and self.size >= self.probes[0]:
+            while self.probes and self.size >= self.probes[0]:
+                self.probes.pop(0)
+            self._check_header(final=not self.probes)
+
+    def _check_header(self, final):
+        self.file.flush()
+        try:
+            check_image_pixels(self.file.file)
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            if final:
+                self.file.close()
+                raise ValidationError({'image': [
+                    'Загрузите правильное изображение'
+                ]})
+            return
+        except ValidationError as exc:
+            self.file.close()
+            raise ValidationError({'image': exc.detail})
+        self.probes = []
+
+
+class StreamingImageJSONParser(JSONParser):
+    """
+    JSON-парсер для создания и изменения рецептов: base64-значение
+    поля image не собирается в памяти целиком, а декодируется
+    порциями во временный файл. Объем и число пикселей проверяются
+    по мере декодирования (RECIPE_IMAGE_MAX_BYTES,
+    RECIPE_IMAGE_MAX_PIXELS). Сериализатор получает загруженный
+    файл вместо строки, остальные поля разбираются как обычно.
+    """
+    field_name = b'image'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return super().parse(stream, media_type, parser_context)
+        max_size = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        scanner = _KeyScanner(self.field_name)
+        buffer, pos, start = b'', 0, None
+        while start is None:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                return self._loads(buffer, parser_context)
+            buffer += chunk
+            if max_size is not None and len(buffer) > max_size:
+                raise ParseError('Слишком большой запрос')
+            start, pos = scanner.scan(buffer, pos)
+        head, rest = buffer[:start], buffer[start + 1:]
+        writer = _Base64Writer()
+        escaped = False
+        while True:
+            end, escaped = _find_string_end(rest, escaped)
+            if end is not None:
+                writer.write(rest[:end])
+                break
+            writer.write(rest)
+            rest = stream.read(CHUNK_SIZE)
+            if not rest:
+                raise ParseError('Неожиданный конец JSON')
+        upload = writer.close()
+        tail = rest[end + 1:] + stream.read(max_size or -1)
+        data = self._loads(head + b'null' + tail, parser_context)
+        data[self.field_name.decode()] = upload
+        return data
+
+    @staticmethod
+    def _loads(body, parser_context):
+        encoding = (parser_context or {}).get('encoding',
+                                              settings.DEFAULT_CHARSET)
+        try:
+            return json.loads(body.decode(encoding))
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
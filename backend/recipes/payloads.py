@@ -0,0 +1,98 @@
+from collections import defaultdict
+
+from .models import Recipe, RecipeIngredient
+from .serializer_fields import image_url
+
+# Вариант изображения ShowRecipeSerializer.image.
+IMAGE_VARIANT = 'card'
+RECIPE_FIELDS = (
+    'id', 'name', 'image', 'image_status', 'text', 'cooking_time',
+    'author_id', 'author__email', 'author__username', 'author__first_name',
+    'author__last_name',
+)
+FLAG_FIELDS = ('is_favorited', 'is_in_shopping_cart', 'is_subscribed')
+
+
+def _tags(recipe_ids):
+    tags = defaultdict(list)
+    rows = Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug',
+    ).order_by('-tag_id')
+    for recipe_id, tag_id, name, color, slug in rows:
+        tags[recipe_id].append(
+            {'id': tag_id, 'name': name, 'color': color, 'slug': slug}
+        )
+    return tags
+
+
+def _ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    rows = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount',
+    ).order_by('id')
+    for recipe_id, ingredient_id, name, unit, amount in rows:
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def recipe_payloads(recipe_ids, context):
+    """
+    Данные ShowRecipeSerializer для рецептов recipe_ids (в том же
+    порядке, отсутствующие пропускаются) без моделей и полей
+    сериализаторов: три запроса values() - рецепты с авторами и
+    флагами, теги, ингредиенты. context - контекст сериализатора
+    (request, image_variant). Совпадение с ShowRecipeSerializer
+    проверяет manage.py check_recipe_payloads.
+    """
+    request = context.get('request')
+    user = request.user if request else None
+    flags = user is not None and user.is_authenticated
+    fields = RECIPE_FIELDS + FLAG_FIELDS if flags else RECIPE_FIELDS
+    rows = {
+        row['id']: row for row in Recipe.objects.filter(
+            pk__in=recipe_ids,
+        ).with_user_flags(user).values(*fields).order_by()
+    }
+    if not rows:
+        return []
+    tags = _tags(rows)
+    ingredients = _ingredients(rows)
+    storage = Recipe._meta.get_field('image').storage
+    variant = context.get('image_variant', IMAGE_VARIANT)
+    payloads = []
+    for pk in recipe_ids:
+        row = rows.get(pk)
+        if row is None:
+            continue
+        image = row['image'] and image_url(
+            storage, row['image'], row['image_status'], variant, request)
+        payloads.append({
+            'id': row['id'],
+            'tags': tags[pk],
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': flags and row['is_subscribed'],
+            },
+            'ingredients': ingredients[pk],
+            'is_favorited': flags and row['is_favorited'],
+            'is_in_shopping_cart': flags and row['is_in_shopping_cart'],
+            'name': row['name'],
+            'image': image or None,
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        })
+    return payloads
@@ -27,6 +27,7 @@ class IsAuthorOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_authenticated and (
                 request.user.is_admin
-                or obj.author == request.user or request.method == 'POST'):
+                or obj.author_id == request.user.id
+                or request.method == 'POST'):
             return True
         return request.method in permissions.SAFE_METHODS
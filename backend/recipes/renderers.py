@@ -0,0 +1,49 @@
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+
+class PlainTextRenderer(BaseRenderer):
+    """
+    Рендерер для ответов в виде простого текста (?format=txt).
+    """
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    """
+    Рендерер для ответов в формате CSV (?format=csv).
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson с тем же результатом: компактный вывод
+    без экранирования не-ASCII символов, кроме U+2028 и U+2029.
+    Даты, Decimal и ленивые строки преобразует кодировщик DRF.
+    Вывод с отступами (browsable API, indent в Accept) и настройки
+    UNICODE_JSON/COMPACT_JSON, отличные от умолчаний, обрабатывает
+    JSONRenderer.
+    """
+    # Ошибки ListField и вложенных списков приходят с ключами-индексами
+    # (int): json выводит их строками, orjson - только с OPT_NON_STR_KEYS.
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (indent is not None or not api_settings.UNICODE_JSON
+                or not api_settings.COMPACT_JSON):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        ret = orjson.dumps(data, default=self.encoder_class().default,
+                           option=self.OPTIONS)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,60 @@
+from drf_base64.fields import Base64ImageField
+from rest_framework import serializers
+
+from .models import Recipe
+from .utils.images import check_image_pixels, check_image_size, variant_name
+
+
+class RecipeBase64ImageField(Base64ImageField):
+    """
+    Base64ImageField с лимитами RECIPE_IMAGE_MAX_BYTES и
+    RECIPE_IMAGE_MAX_PIXELS. Объем строки base64 проверяется до
+    декодирования, число пикселей - по заголовку файла. Файл от
+    StreamingImageJSONParser к этому моменту уже проверен.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:'):
+            check_image_size(len(data.partition(',')[2]) * 3 // 4)
+        file = super().to_internal_value(data)
+        check_image_pixels(file)
+        return file
+
+
+class RecipeImageField(serializers.ImageField):
+    """
+    Ссылка на вариант изображения рецепта нужной ширины.
+    Вариант задается аргументом variant или ключом image_variant
+    контекста сериализатора. Пока фоновый процесс не подготовил
+    варианты, отдается оригинал.
+    """
+
+    def __init__(self, variant=None, **kwargs):
+        kwargs.setdefault('read_only', True)
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        recipe = getattr(value, 'instance', None)
+        return image_url(
+            value.storage, value.name,
+            getattr(recipe, 'image_status', None),
+            self.context.get('image_variant', self.variant),
+            self.context.get('request'),
+        )
+
+
+def image_url(storage, name, image_status, variant, request=None):
+    """
+    Адрес варианта изображения рецепта (или оригинала, пока
+    варианты не готовы); абсолютный, если передан запрос.
+    """
+    if variant and image_status == Recipe.IMAGE_READY:
+        url = storage.url(variant_name(name, variant))
+    else:
+        url = storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
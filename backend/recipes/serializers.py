@@ -1,9 +1,10 @@
 from django.contrib.auth import get_user_model
-from django.db.models import F
-from drf_base64.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from foodgram.metrics import TimedSerializerMixin
+from foodgram.pagination import MAX_PAGE_SIZE
 from users.serializers import CustomUserSerializer  # isort:skip
 from .models import (
     FavoriteRecipe,
@@ -11,13 +12,19 @@ from .models import (
     Recipe,
     RecipeIngredient,
     ShoppingList,
+    ShoppingListItem,
     Tag
 )
+from .serializer_fields import RecipeBase64ImageField, RecipeImageField
+from .utils.bulk import delete_rows
+from .utils.counters import change_counters
+from .utils.shopping_list import (change_shopping_items,
+                                  invalidate_shopping_lists)
 
 User = get_user_model()
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для вывода тэгов.
     """
@@ -32,7 +39,7 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для вывода ингредиентов.
     """
@@ -46,7 +53,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class ShowIngredientsInRecipeSerializer(serializers.ModelSerializer):
+class ShowIngredientsInRecipeSerializer(TimedSerializerMixin,
+                                        serializers.ModelSerializer):
     """
     Сериализатор для вывода ингредиентов в рецепте.
     """
@@ -66,18 +74,43 @@ class ShowIngredientsInRecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class ShoppingListItemSerializer(ShowIngredientsInRecipeSerializer):
+    """
+    Сериализатор позиции сводного списка покупок.
+    """
+
+    class Meta(ShowIngredientsInRecipeSerializer.Meta):
+        model = ShoppingListItem
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Cериализатор для модели Recipe с укороченным набором полей.
     """
-    image = Base64ImageField()
+    image = RecipeImageField('thumb')
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class ShowRecipeSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Список id рецептов для пакетного добавления в избранное
+    и список покупок и удаления из них.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_PAGE_SIZE,
+    )
+
+    @staticmethod
+    def validate_ids(ids):
+        return list(dict.fromkeys(ids))
+
+
+class ShowRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для работы с рецептами.
     """
@@ -86,7 +119,7 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField('card')
 
     class Meta:
         model = Recipe
@@ -96,7 +129,7 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_ingredients(obj):
-        ingredients = RecipeIngredient.objects.filter(recipe=obj)
+        ingredients = obj.recipe_ingredient.all()
         return ShowIngredientsInRecipeSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
@@ -106,6 +139,8 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return FavoriteRecipe.objects.filter(recipe=obj,
                                              user=request.user).exists()
 
@@ -116,6 +151,8 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return ShoppingList.objects.filter(recipe=obj,
                                            user=request.user).exists()
 
@@ -123,8 +160,10 @@ class ShowRecipeSerializer(serializers.ModelSerializer):
 class AddIngredientRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для добавления Ингредиентов.
+    Существование ингредиентов проверяется одним запросом
+    в AddRecipeSerializer.validate_ingredients.
     """
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -132,14 +171,13 @@ class AddIngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class AddRecipeSerializer(serializers.ModelSerializer):
+class AddRecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для добавления рецептов.
     """
     ingredients = AddIngredientRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
-    image = Base64ImageField()
+    tags = serializers.ListField(child=serializers.IntegerField())
+    image = RecipeBase64ImageField()
     name = serializers.CharField(max_length=200)
     cooking_time = serializers.IntegerField()
     author = CustomUserSerializer(read_only=True)
@@ -150,6 +188,19 @@ class AddRecipeSerializer(serializers.ModelSerializer):
                   'image', 'name', 'text',
                   'cooking_time', 'author')
 
+    @staticmethod
+    def _check_exist(model, ids, message):
+        """
+        Проверка существования объектов одним запросом.
+        """
+        found = set(model.objects.filter(id__in=ids).values_list(
+            'id', flat=True))
+        missing = sorted(set(ids) - found)
+        if missing:
+            raise ValidationError(
+                f'{message}: {", ".join(map(str, missing))}'
+            )
+
     def validate_ingredients(self, ingredients):
         """
         Проверка ингредиентов.
@@ -168,8 +219,17 @@ class AddRecipeSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 'Ингредиенты в рецепте должны быть уникальными!'
             )
+        self._check_exist(Ingredient, ids, 'Ингредиенты не найдены')
         return ingredients
 
+    def validate_tags(self, tags):
+        """
+        Проверка тегов.
+        """
+        tags = list(dict.fromkeys(tags))
+        self._check_exist(Tag, tags, 'Теги не найдены')
+        return tags
+
     @staticmethod
     def validate_cooking_time(value):
         if value <= 0:
@@ -179,18 +239,75 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         return value
 
     @staticmethod
-    def add_ingredients(ingredients, recipe):
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            amount = ingredient['amount']
-            if RecipeIngredient.objects.filter(
-                    recipe=recipe, ingredient=ingredient_id).exists():
-                amount += F('amount')
-            RecipeIngredient.objects.update_or_create(
-                recipe=recipe, ingredient=ingredient_id,
-                defaults={'amount': amount}
-            )
+    def set_ingredients(recipe, ingredients, created=False):
+        """
+        Приводит ингредиенты рецепта к переданному списку:
+        вставки, изменения количества и удаления выполняются
+        пакетными запросами без сигналов, поэтому usage_count
+        ингредиентов обновляется здесь же - одним запросом на все
+        ингредиенты. Версию рецепта и поисковый документ обновляет
+        последующее сохранение рецепта в create/update. Разница
+        количеств переносится в сводные списки покупок пользователей,
+        у которых рецепт в списке.
+        """
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        existing = {} if created else {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        removed = existing.keys() - amounts.keys()
+        added = amounts.keys() - existing.keys()
+        if removed:
+            delete_rows(RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed))
+        usage = dict.fromkeys(added, 1)
+        usage.update(dict.fromkeys(removed, -1))
+        change_counters(Ingredient, 'usage_count', usage)
+        changed, changed_amounts = [], {}
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                changed_amounts[ingredient_id] = amount - item.amount
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id in added
+        )
+        if created or not (removed or changed or added):
+            return
+        deltas = {ingredient_id: amounts[ingredient_id]
+                  for ingredient_id in added}
+        deltas.update(changed_amounts)
+        deltas.update((ingredient_id, -existing[ingredient_id].amount)
+                      for ingredient_id in removed)
+        user_ids = list(ShoppingList.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True))
+        invalidate_shopping_lists(user_ids)
+        change_shopping_items(user_ids, deltas)
+
+    @staticmethod
+    def set_tags(recipe, tags, created=False):
+        """
+        Приводит теги рецепта к переданному списку.
+        """
+        through = Recipe.tags.through
+        existing = set() if created else set(through.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        removed = existing - set(tags)
+        if removed:
+            through.objects.filter(recipe=recipe,
+                                   tag_id__in=removed).delete()
+        through.objects.bulk_create(
+            through(recipe_id=recipe.id, tag_id=tag_id)
+            for tag_id in tags if tag_id not in existing
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags_data = validated_data.pop('tags')
@@ -198,29 +315,36 @@ class AddRecipeSerializer(serializers.ModelSerializer):
         image = validated_data.pop('image')
         recipe = Recipe.objects.create(image=image, author=author,
                                        **validated_data)
-        self.add_ingredients(ingredients_data, recipe)
-        recipe.tags.set(tags_data)
+        self.set_ingredients(recipe, ingredients_data, created=True)
+        self.set_tags(recipe, tags_data, created=True)
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-        self.add_ingredients(ingredients, recipe)
-        recipe.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.set_ingredients(recipe, ingredients)
+        if tags is not None:
+            self.set_tags(recipe, tags)
         return super().update(recipe, validated_data)
 
     def to_representation(self, recipe):
+        request = self.context.get('request')
+        recipe = Recipe.objects.with_related(
+            request.user if request else None).get(pk=recipe.pk)
         data = ShowRecipeSerializer(
             recipe,
-            context={'request': self.context.get('request')}).data
+            context={'request': request}).data
         return data
 
 
-class ShowFavoriteRecipeShopListSerializer(serializers.ModelSerializer):
+class ShowFavoriteRecipeShopListSerializer(TimedSerializerMixin,
+                                           serializers.ModelSerializer):
     """
     Сериализатор для краткого отображения сведений о рецепте.
     """
+    image = RecipeImageField('thumb')
 
     class Meta:
         model = Recipe
@@ -228,7 +352,8 @@ class ShowFavoriteRecipeShopListSerializer(serializers.ModelSerializer):
                   'image', 'cooking_time')
 
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
+class FavoriteRecipeSerializer(TimedSerializerMixin,
+                               serializers.ModelSerializer):
     """
     Сериализатор для списка избранного.
     """
@@ -264,7 +389,8 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
         ).data
 
 
-class ShoppingListSerializer(serializers.ModelSerializer):
+class ShoppingListSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
 
@@ -0,0 +1,183 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from users.models import Follow  # isort:skip
+from .caching import bump_catalog_version
+from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingList, Tag)
+from .utils.counters import User, change_counter
+from .utils.feed import backfill, fan_out, remove_author
+from .utils.search import delete_search_documents, update_search_on_commit
+from .utils.shopping_list import (change_shopping_items,
+                                  invalidate_shopping_lists, recipe_amounts)
+
+
+# Внешние ключи связей: API их только добавляет и удаляет,
+# изменение существующей записи возможно в админке.
+RELATION_FIELDS = {
+    FavoriteRecipe: ('user_id', 'recipe_id'),
+    ShoppingList: ('user_id', 'recipe_id'),
+    Follow: ('user_id', 'author_id'),
+    RecipeIngredient: ('recipe_id', 'ingredient_id'),
+}
+
+
+def _counter_delta(signal, created):
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(pre_save, sender=FavoriteRecipe)
+@receiver(pre_save, sender=ShoppingList)
+@receiver(pre_save, sender=Follow)
+@receiver(pre_save, sender=RecipeIngredient)
+def relation_changing(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_relation = sender.objects.filter(
+        pk=instance.pk).values(*RELATION_FIELDS[sender]).first()
+
+
+def _moved_from(instance, signal):
+    """
+    Прежняя версия сохраненной записи связи, если у нее сменились
+    внешние ключи. Такое изменение обрабатывается как удаление
+    прежней записи и создание новой: счетчики, ленты и сводные
+    списки переносятся.
+    """
+    previous = instance.__dict__.pop('_previous_relation', None)
+    if signal is not post_save or previous is None or all(
+            getattr(instance, field) == value
+            for field, value in previous.items()):
+        return None
+    return type(instance)(pk=instance.pk, **previous)
+
+
+@receiver((post_save, post_delete), sender=ShoppingList)
+def shopping_list_changed(sender, instance, signal, created=False,
+                          **kwargs):
+    previous = _moved_from(instance, signal)
+    if previous is not None:
+        shopping_list_deleting(sender, previous)
+        shopping_list_changed(sender, previous, post_delete)
+        created = True
+    invalidate_shopping_lists([instance.user_id])
+    delta = _counter_delta(signal, created)
+    if delta:
+        change_counter(Recipe, [instance.recipe_id], 'in_carts_count', delta)
+    if created:
+        change_shopping_items([instance.user_id],
+                              recipe_amounts(instance.recipe_id))
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def shopping_list_deleting(sender, instance, **kwargs):
+    """
+    Вычитание из сводного списка до удаления: при каскадном
+    удалении рецепта его ингредиенты еще не удалены.
+    """
+    change_shopping_items([instance.user_id], {
+        ingredient_id: -amount for ingredient_id, amount
+        in recipe_amounts(instance.recipe_id).items()
+    })
+
+
+@receiver((post_save, post_delete), sender=FavoriteRecipe)
+def favorite_changed(sender, instance, signal, created=False, **kwargs):
+    previous = _moved_from(instance, signal)
+    if previous is not None:
+        favorite_changed(sender, previous, post_delete)
+        created = True
+    delta = _counter_delta(signal, created)
+    if delta:
+        change_counter(Recipe, [instance.recipe_id], 'favorites_count',
+                       delta)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_created_or_deleted(sender, instance, signal, created=False,
+                              **kwargs):
+    delta = _counter_delta(signal, created)
+    if delta:
+        change_counter(User, [instance.author_id], 'recipes_count', delta)
+    if created:
+        transaction.on_commit(lambda: fan_out([instance.pk]))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_search_changed(sender, instance, signal, **kwargs):
+    if signal is post_delete:
+        delete_search_documents([instance.pk])
+    else:
+        update_search_on_commit(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version(sender)
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def follow_changed(sender, instance, signal, created=False, **kwargs):
+    previous = _moved_from(instance, signal)
+    if previous is not None:
+        follow_changed(sender, previous, post_delete)
+        created = True
+    delta = _counter_delta(signal, created)
+    if delta:
+        change_counter(User, [instance.author_id], 'followers_count', delta)
+    if delta > 0:
+        backfill(instance.user_id, instance.author_id)
+    elif delta < 0:
+        remove_author(instance.user_id, instance.author_id)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, signal, created=False,
+                              **kwargs):
+    """
+    Изменения отдельных записей (админка). Пакетные вставка,
+    изменение и удаление сигналов не отправляют: версию рецепта,
+    usage_count и поисковый документ обновляет вызывающий код
+    (AddRecipeSerializer.set_ingredients).
+    """
+    previous = _moved_from(instance, signal)
+    if previous is not None:
+        recipe_ingredient_changed(sender, previous, post_delete)
+        created = True
+    Recipe.objects.filter(pk=instance.recipe_id).touch()
+    update_search_on_commit(Recipe.objects.filter(pk=instance.recipe_id))
+    delta = _counter_delta(signal, created)
+    if delta:
+        change_counter(Ingredient, [instance.ingredient_id], 'usage_count',
+                       delta)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        Recipe.objects.filter(pk=instance.pk).touch()
+    elif pk_set:
+        Recipe.objects.filter(pk__in=pk_set).touch()
+    else:
+        Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    Recipe.objects.filter(tags=instance).touch()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        recipes = Recipe.objects.filter(recipe_ingredient__ingredient=instance)
+        recipes.touch()
+        update_search_on_commit(recipes)
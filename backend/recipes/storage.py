@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+@deconstructible
+class PrivateStorage(FileSystemStorage):
+    """
+    Файлы в PRIVATE_MEDIA_ROOT: каталог не публикуется по MEDIA_URL,
+    файлы отдаются только через view (X-Accel-Redirect на internal
+    location nginx или FileResponse).
+    """
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'PRIVATE_MEDIA_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location,
+                                      settings.PRIVATE_MEDIA_ROOT)
+
+    def url(self, name):
+        raise ValueError('Файлы PrivateStorage не имеют публичного адреса')
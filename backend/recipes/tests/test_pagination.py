@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class CursorPaginationTest(TestCase):
+    """
+    Keyset-пагинация упорядочивает выдачу по id: параметры,
+    меняющие порядок, с ней отклоняются, а не игнорируются.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password')
+        for i in range(3):
+            Recipe.objects.create(name=f'Суп {i}', text='Описание',
+                                  cooking_time=10, image=f'recipes/{i}.png',
+                                  author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_cursor(self):
+        response = self.client.get('/api/recipes/?paginate=cursor&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_cursor_with_ordering(self):
+        for query in ('paginate=cursor&search=суп',
+                      'paginate=cursor&ordering=favorites',
+                      'cursor=cD0x&ordering=in_carts'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(len(response.json()), 1)
+
+    def test_page_with_ordering(self):
+        for query in ('search=суп', 'ordering=favorites'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.management.commands.check_recipe_payloads import CONTEXTS
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag
+)
+from recipes.payloads import recipe_payloads
+from recipes.renderers import FastJSONRenderer
+from recipes.serializers import ShowRecipeSerializer
+from users.models import Follow
+
+User = get_user_model()
+
+
+class RecipePayloadsTest(TestCase):
+    """
+    recipe_payloads() + FastJSONRenderer дают те же байты, что
+    ShowRecipeSerializer + JSONRenderer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия', password='password')
+        cls.fan = User.objects.create_user(
+            username='fan', email='fan@example.com', password='password')
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='password')
+        cls.follower = User.objects.create_user(
+            username='follower', email='follower@example.com',
+            password='password')
+        tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag-{i}')
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент "{i}"',
+                                      measurement_unit='г')
+            for i in range(4)
+        ]
+        names = ('Суп', 'Пирог "домашний"', 'Рагу\u2028с переводом', 'Каша')
+        cls.recipes = []
+        for i, name in enumerate(names):
+            recipe = Recipe.objects.create(
+                name=name, text=f'Описание\n{i}', cooking_time=i + 1,
+                image=f'recipes/{i}.png', author=author)
+            recipe.tags.set(tags[:i])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10 * (index + 1))
+                for index, ingredient in enumerate(ingredients[i:])
+            )
+            cls.recipes.append(recipe)
+        FavoriteRecipe.objects.create(user=cls.fan, recipe=cls.recipes[0])
+        FavoriteRecipe.objects.create(user=cls.fan, recipe=cls.recipes[2])
+        FavoriteRecipe.objects.create(user=cls.buyer, recipe=cls.recipes[2])
+        ShoppingList.objects.create(user=cls.buyer, recipe=cls.recipes[1])
+        ShoppingList.objects.create(user=cls.buyer, recipe=cls.recipes[2])
+        Follow.objects.create(user=cls.follower, author=author)
+        # Варианты изображения готовит фоновый процесс.
+        Recipe.objects.filter(pk=cls.recipes[3].pk).update(
+            image_status=Recipe.IMAGE_READY)
+
+    def assert_same_payloads(self, user):
+        """
+        Сравнивает payload всех рецептов и возвращает ожидаемые
+        данные сериализатора по контекстам.
+        """
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        ids = [recipe.pk for recipe in reversed(self.recipes)]
+        results = []
+        for extra in CONTEXTS:
+            context = dict(extra, request=request)
+            recipes = Recipe.objects.with_related(user).in_bulk(ids)
+            expected = ShowRecipeSerializer(
+                [recipes[pk] for pk in ids], many=True, context=context).data
+            with self.subTest(user=user, context=extra):
+                self.assertEqual(
+                    FastJSONRenderer().render(recipe_payloads(ids, context)),
+                    JSONRenderer().render(expected),
+                )
+            results.append(expected)
+        return results
+
+    def test_anonymous(self):
+        self.assert_same_payloads(AnonymousUser())
+
+    def test_favorites(self):
+        self.assert_same_payloads(self.fan)
+
+    def test_shopping_list(self):
+        self.assert_same_payloads(self.buyer)
+
+    def test_subscription(self):
+        for expected in self.assert_same_payloads(self.follower):
+            self.assertTrue(all(
+                recipe['author']['is_subscribed'] for recipe in expected))
+
+    def test_image_variants(self):
+        ready = self.recipes[3]
+        for expected in self.assert_same_payloads(AnonymousUser()):
+            images = {recipe['id']: recipe['image'] for recipe in expected}
+            self.assertNotIn(ready.image.name, images[ready.pk])
+            self.assertTrue(images[self.recipes[0].pk].endswith(
+                self.recipes[0].image.name))
@@ -0,0 +1,32 @@
+import shutil
+import tempfile
+
+from django.test import TransactionTestCase, override_settings
+
+from recipes.management.commands.check_query_budget import (
+    ENDPOINTS,
+    TEST_CACHES,
+    find_failures,
+    measure
+)
+
+
+class QueryBudgetTest(TransactionTestCase):
+    """
+    Бюджет SQL-запросов эндпоинтов API (как manage.py
+    check_query_budget) для первого вызова с пустым кэшем
+    и повторных вызовов. Транзакции фиксируются, поэтому
+    обработчики on_commit выполняются как в рабочем режиме.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def test_query_budget(self):
+        with override_settings(MEDIA_ROOT=self.media_root,
+                               PRIVATE_MEDIA_ROOT=self.media_root,
+                               CACHES=TEST_CACHES, DATABASE_REPLICAS=[]):
+            results = measure(ENDPOINTS, sizes=(20, 60), limits=(2, 6),
+                              repeat=2)
+        self.assertEqual(find_failures(ENDPOINTS, results), [])
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from recipes.renderers import FastJSONRenderer
+
+User = get_user_model()
+
+
+class FastJSONRendererTest(TestCase):
+    """
+    Ошибки проверки списков (ключи-индексы) рендерятся как
+    в JSONRenderer, а не приводят к ошибке 500.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            username='user', email='user@example.com', password='password'))
+
+    def test_integer_keys(self):
+        data = {'tags': {0: ['Неверное значение.']}, 'ids': [1, 2]}
+        self.assertEqual(FastJSONRenderer().render(data),
+                         JSONRenderer().render(data))
+
+    def test_invalid_batch_ids(self):
+        response = self.client.post('/api/recipes/favorite/',
+                                    {'ids': ['x']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('0', response.json()['ids'])
+
+    def test_invalid_recipe_tags(self):
+        response = self.client.post('/api/recipes/', {
+            'name': 'Суп', 'text': 'Описание', 'cooking_time': 10,
+            'tags': ['a'], 'ingredients': [],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
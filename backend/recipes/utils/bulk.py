@@ -0,0 +1,46 @@
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router, transaction
+
+
+def delete_rows(queryset):
+    """
+    Удаление записей queryset одним запросом DELETE без загрузки
+    моделей и без сигналов pre_delete/post_delete: счетчики
+    и производные данные обновляет вызывающий код. Каскадное
+    удаление не выполняется, поэтому функция применяется только
+    к таблицам, на которые не ссылаются другие (связи рецептов
+    с ингредиентами, избранное, списки покупок).
+    Возвращает число удаленных записей.
+    """
+    model = queryset.model
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    try:
+        sql, params = queryset.using(alias).order_by().values(
+            'pk').query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.pk.column)} IN ({sql})',
+            params,
+        )
+        return cursor.rowcount
+
+
+def claim_rows(queryset, limit, **values):
+    """
+    Захват до limit записей queryset фоновым процессом: записи
+    выбираются с SKIP LOCKED и помечаются значениями values в короткой
+    транзакции, долгая обработка идет уже без блокировок строк.
+    Возвращает первичные ключи захваченных записей.
+    """
+    model = queryset.model
+    with transaction.atomic(using=router.db_for_write(model)):
+        ids = list(queryset.select_for_update(skip_locked=True).values_list(
+            'pk', flat=True)[:limit])
+        if ids:
+            model.objects.filter(pk__in=ids).update(**values)
+    return ids
@@ -0,0 +1,97 @@
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import (  # isort:skip
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList
+)
+from users.models import Follow  # isort:skip
+
+User = get_user_model()
+
+Counter = namedtuple('Counter', ('model', 'field', 'related', 'fk'))
+
+COUNTERS = (
+    Counter(Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    Counter(Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    Counter(Ingredient, 'usage_count', RecipeIngredient, 'ingredient'),
+    Counter(User, 'recipes_count', Recipe, 'author'),
+    Counter(User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, pks, field, delta):
+    """
+    Атомарное изменение счетчика выражением F() без чтения записи.
+    Счетчик не опускается ниже нуля: расхождение исправит recount.
+    """
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def change_counters(model, field, deltas):
+    """
+    Изменение счетчика нескольких записей на разные величины
+    (deltas - словарь pk -> приращение) одним UPDATE с CASE.
+    Счетчик не опускается ниже нуля.
+    """
+    groups = {}
+    for pk, delta in deltas.items():
+        if delta:
+            groups.setdefault(delta, []).append(pk)
+    if not groups:
+        return 0
+    return model.objects.filter(
+        pk__in=[pk for pks in groups.values() for pk in pks],
+    ).update(**{field: Greatest(
+        F(field) + Case(
+            *(When(pk__in=pks, then=Value(delta))
+              for delta, pks in groups.items()),
+            output_field=models.IntegerField(),
+        ),
+        0,
+    )})
+
+
+def actual_count(counter):
+    """
+    Подзапрос с фактическим числом связанных записей.
+    """
+    related = counter.related.objects.filter(
+        **{counter.fk: OuterRef('pk')}
+    ).order_by().values(counter.fk).annotate(count=Count('pk'))
+    return Coalesce(
+        Subquery(related.values('count'),
+                 output_field=models.IntegerField()),
+        0,
+    )
+
+
+def find_drift(counter):
+    """
+    Записи, у которых сохраненный счетчик расходится с фактическим.
+    """
+    return counter.model.objects.annotate(
+        actual=actual_count(counter),
+    ).exclude(**{counter.field: F('actual')})
+
+
+def recount(counters=COUNTERS):
+    """
+    Пересчет счетчиков одним UPDATE на каждый счетчик.
+    """
+    with transaction.atomic():
+        return {
+            counter: counter.model.objects.update(
+                **{counter.field: actual_count(counter)})
+            for counter in counters
+        }
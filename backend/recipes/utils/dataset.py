@@ -0,0 +1,236 @@
+import io
+import random
+from bisect import bisect
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from recipes.caching import bump_catalog_version  # isort:skip
+from recipes.models import (  # isort:skip
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList,
+    Tag
+)
+from users.models import Follow  # isort:skip
+from .counters import recount  # isort:skip
+from .search import update_search_documents  # isort:skip
+from .shopping_list import rebuild_shopping_items  # isort:skip
+from .images import render_image_variants  # isort:skip
+
+User = get_user_model()
+
+PLACEHOLDER_IMAGE = 'recipes/generated.png'
+DISHES = ('Суп', 'Салат', 'Пирог', 'Рагу', 'Каша', 'Запеканка', 'Омлет',
+          'Паста', 'Плов', 'Котлеты', 'Блины', 'Десерт')
+ADJECTIVES = ('домашний', 'быстрый', 'летний', 'острый', 'пряный',
+              'праздничный', 'овощной', 'сытный', 'легкий', 'фирменный')
+
+
+def batched(iterable, size):
+    """
+    Разбивает итератор на списки длиной не более size.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class PowerLawSampler:
+    """
+    Выбор элементов с вероятностью, обратно пропорциональной
+    рангу элемента в степени alpha (закон Ципфа).
+    """
+
+    def __init__(self, items, alpha, rng):
+        self.items = items
+        self.rng = rng
+        self.cum_weights = list(accumulate(
+            1 / rank ** alpha for rank in range(1, len(items) + 1)
+        ))
+
+    def choice(self):
+        point = self.rng.random() * self.cum_weights[-1]
+        return self.items[bisect(self.cum_weights, point)]
+
+    def sample(self, count):
+        """
+        До count различных элементов (без повторов).
+        """
+        count = min(count, len(self.items))
+        result = set()
+        for _ in range(count * 3):
+            result.add(self.choice())
+            if len(result) == count:
+                break
+        return result
+
+
+class DatasetGenerator:
+    """
+    Детерминированный генератор синтетических данных.
+    Все записи создаются через bulk_create пачками по batch_size,
+    одинаковый seed дает одинаковый набор данных. Повторный запуск
+    с тем же seed не создает новых записей: у каждого этапа свой
+    поток случайных чисел, который зависит только от seed и имени
+    этапа, а уже созданные рецепты и связи пропускаются.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, prefix='gen', alpha=1.1,
+                 log=None):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.alpha = alpha
+        self.log = log or (lambda message: None)
+
+    def rng(self, stage):
+        return random.Random(f'{self.seed}:{stage}')
+
+    def _bulk_create(self, model, objects):
+        created = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        self.log(f'{model._meta.verbose_name_plural}: {created}')
+        return created
+
+    def create_users(self, count):
+        password = make_password(f'{self.prefix}-password')
+        self._bulk_create(User, (
+            User(username=f'{self.prefix}-user-{i}',
+                 email=f'{self.prefix}-user-{i}@example.com',
+                 first_name='Имя', last_name=f'Фамилия {i}',
+                 password=password)
+            for i in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}-user-'
+        ).order_by('id').values_list('id', flat=True))
+
+    def ensure_tags(self, count=3):
+        if not Tag.objects.exists():
+            self._bulk_create(Tag, (
+                Tag(name=f'Тег {i}', color=f'#{i * 9973 % 0xffffff:06x}',
+                    slug=f'{self.prefix}-tag-{i}')
+                for i in range(count)
+            ))
+            bump_catalog_version(Tag)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def ensure_ingredients(self, count=500):
+        if not Ingredient.objects.exists():
+            units = ('г', 'кг', 'мл', 'шт.', 'ст. л.', 'по вкусу')
+            self._bulk_create(Ingredient, (
+                Ingredient(name=f'Ингредиент {i}',
+                           measurement_unit=units[i % len(units)])
+                for i in range(count)
+            ))
+            bump_catalog_version(Ingredient)
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+
+    @staticmethod
+    def placeholder_image():
+        if not default_storage.exists(PLACEHOLDER_IMAGE):
+            buffer = io.BytesIO()
+            Image.new('RGB', (480, 320), (244, 162, 97)).save(buffer, 'PNG')
+            name = default_storage.save(PLACEHOLDER_IMAGE,
+                                        ContentFile(buffer.getvalue()))
+            render_image_variants(Recipe(image=name).image)
+        return PLACEHOLDER_IMAGE
+
+    def _generated_recipes(self, author_ids):
+        return Recipe.objects.filter(
+            author_id__in=author_ids,
+            name__contains=f' {self.prefix}-',
+        )
+
+    def create_recipes(self, count, author_ids):
+        """
+        Рецепты с номерами меньше числа уже созданных пропускаются,
+        но случайные числа для них все равно выбираются, чтобы
+        следующие рецепты совпадали с первым запуском.
+        """
+        rng = self.rng('recipes')
+        authors = PowerLawSampler(author_ids, self.alpha, rng)
+        image = self.placeholder_image()
+        existing = self._generated_recipes(author_ids).count()
+        recipes = (
+            Recipe(
+                name=(f'{rng.choice(DISHES)} '
+                      f'{rng.choice(ADJECTIVES)} '
+                      f'{self.prefix}-{i}'),
+                text='Описание рецепта. ' * rng.randint(1, 20),
+                cooking_time=rng.randint(5, 180),
+                image=image,
+                image_status=Recipe.IMAGE_READY,
+                author_id=authors.choice(),
+            )
+            for i in range(count)
+        )
+        self._bulk_create(Recipe, islice(recipes, existing, None))
+        return list(self._generated_recipes(author_ids).order_by(
+            'id').values_list('id', flat=True)[:count])
+
+    def create_recipe_relations(self, recipe_ids, tag_ids, ingredient_ids,
+                                ingredients_range=(3, 12),
+                                tags_range=(1, 3)):
+        rng = self.rng('recipe_ingredients')
+        ingredients = PowerLawSampler(ingredient_ids, self.alpha, rng)
+        self._bulk_create(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in ingredients.sample(
+                rng.randint(*ingredients_range))
+        ))
+        rng = self.rng('recipe_tags')
+        tags = PowerLawSampler(tag_ids, self.alpha, rng)
+        self._bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in tags.sample(rng.randint(*tags_range))
+        ))
+
+    def _user_edges(self, model, user_ids, target_ids, per_user, field):
+        rng = self.rng(model._meta.model_name)
+        targets = PowerLawSampler(target_ids, self.alpha, rng)
+        self._bulk_create(model, (
+            model(user_id=user_id, **{field: target_id})
+            for user_id in user_ids
+            for target_id in targets.sample(rng.randint(0, per_user * 2))
+            if target_id != user_id or field != 'author_id'
+        ))
+
+    def create_follows(self, user_ids, per_user):
+        self._user_edges(Follow, user_ids, user_ids, per_user, 'author_id')
+
+    def create_favorites(self, user_ids, recipe_ids, per_user):
+        self._user_edges(FavoriteRecipe, user_ids, recipe_ids, per_user,
+                         'recipe_id')
+
+    def create_shopping_lists(self, user_ids, recipe_ids, per_user):
+        self._user_edges(ShoppingList, user_ids, recipe_ids, per_user,
+                         'recipe_id')
+
+    def recount_counters(self):
+        for counter, updated in recount().items():
+            self.log(f'{counter.model._meta.verbose_name_plural}.'
+                     f'{counter.field}: {updated}')
+        self.log(f'shopping list items: {rebuild_shopping_items()}')
+
+    def index_search(self, recipe_ids):
+        for batch in batched(recipe_ids, self.batch_size):
+            update_search_documents(Recipe.objects.filter(pk__in=batch))
+        self.log(f'search documents: {len(recipe_ids)}')
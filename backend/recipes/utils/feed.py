@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import FeedEntry, Recipe  # isort:skip
+from users.models import Follow  # isort:skip
+from .dataset import batched  # isort:skip
+
+
+def fan_out(recipe_ids):
+    """
+    Рассылка рецептов в ленты подписчиков автора пачками по
+    FEED_FANOUT_BATCH. Рецепты авторов с числом подписчиков больше
+    FEED_FANOUT_MAX_FOLLOWERS не рассылаются и выбираются при чтении.
+    Рецепты авторов без подписчиков только отмечаются разосланными.
+    """
+    recipes = Recipe.objects.filter(
+        id__in=recipe_ids,
+        fanned_out=False,
+        author__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('id', 'author_id', 'author__followers_count')
+    for recipe_id, author_id, followers_count in recipes:
+        if not followers_count:
+            Recipe.objects.filter(pk=recipe_id).update(fanned_out=True)
+            continue
+        with transaction.atomic():
+            followers = Follow.objects.filter(
+                author_id=author_id,
+            ).values_list('user_id', flat=True).iterator()
+            for batch in batched(followers, settings.FEED_FANOUT_BATCH):
+                FeedEntry.objects.bulk_create(
+                    (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                               author_id=author_id) for user_id in batch),
+                    ignore_conflicts=True,
+                )
+            Recipe.objects.filter(pk=recipe_id).update(fanned_out=True)
+
+
+def backfill(user_id, author_id):
+    """
+    Последние разосланные рецепты автора в ленту нового подписчика.
+    """
+    recipes = Recipe.objects.filter(
+        author_id=author_id, fanned_out=True,
+    ).order_by('-id').values_list('id', flat=True)[:settings.FEED_BACKFILL]
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+         for recipe_id in recipes),
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed_recipe_ids(user, limit, before=None):
+    """
+    id рецептов страницы ленты по убыванию, меньше before.
+    Материализованная лента читается одним диапазонным сканированием
+    индекса (user, recipe); неразосланные рецепты подписок
+    добираются по частичному индексу recipe_pull_feed_idx.
+    """
+    timeline = FeedEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(author__following__user=user,
+                                   fanned_out=False)
+    if before is not None:
+        timeline = timeline.filter(recipe_id__lt=before)
+        pulled = pulled.filter(id__lt=before)
+    ids = set(timeline.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit])
+    ids.update(pulled.order_by('-id').values_list('id', flat=True)[:limit])
+    return sorted(ids, reverse=True)[:limit]
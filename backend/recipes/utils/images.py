@@ -0,0 +1,86 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'AVIF': 'avif',
+    'JPEG': 'jpg',
+}
+
+
+def variant_name(name, variant):
+    """
+    Имя файла варианта рядом с оригиналом:
+    recipes/photo.png -> recipes/photo.card.webp.
+    """
+    root, _ = os.path.splitext(name)
+    extension = EXTENSIONS[settings.RECIPE_IMAGE_FORMAT.upper()]
+    return f'{root}.{variant}.{extension}'
+
+
+def check_image_size(size):
+    if size > settings.RECIPE_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            f'Размер изображения больше '
+            f'{settings.RECIPE_IMAGE_MAX_BYTES} байт'
+        )
+
+
+def check_image_pixels(file):
+    """
+    Проверка числа пикселей по заголовку, без декодирования растра.
+    """
+    position = file.tell()
+    file.seek(0)
+    try:
+        width, height = Image.open(file).size
+    except Image.DecompressionBombError:
+        width, height = settings.RECIPE_IMAGE_MAX_PIXELS + 1, 1
+    finally:
+        file.seek(position)
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Изображение больше {settings.RECIPE_IMAGE_MAX_PIXELS} '
+            f'пикселей'
+        )
+
+
+def _resize(image, width):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def render_image_variants(field_file):
+    """
+    Сохраняет варианты изображения фиксированной ширины.
+    Изображение уменьшается последовательно от большего
+    варианта к меньшему, увеличение не выполняется.
+    """
+    image_format = settings.RECIPE_IMAGE_FORMAT.upper()
+    variants = sorted(settings.RECIPE_IMAGE_VARIANTS.items(),
+                      key=lambda item: item[1], reverse=True)
+    storage = field_file.storage
+    with field_file.open('rb') as file:
+        image = Image.open(file)
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', (variants[0][1], variants[0][1]))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    names = []
+    for variant, width in variants:
+        image = _resize(image, width)
+        buffer = io.BytesIO()
+        image.save(buffer, image_format,
+                   quality=settings.RECIPE_IMAGE_QUALITY)
+        name = variant_name(field_file.name, variant)
+        if storage.exists(name):
+            storage.delete(name)
+        names.append(storage.save(name, ContentFile(buffer.getvalue())))
+    return names
@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+import os
+import time
+from collections import namedtuple
+
+from django.db import connection, transaction
+
+from .dataset import batched
+
+ImportResult = namedtuple('ImportResult', ('total', 'inserted', 'elapsed'))
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """
+    Потоковое чтение JSON-массива объектов без загрузки файла целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item
+
+
+def read_rows(path, fields):
+    """
+    Построчно читает CSV или JSON (массив объектов) и возвращает
+    кортежи значений в порядке fields. Строки CSV с неверным
+    числом колонок пропускаются.
+    """
+    with open(path, 'r', encoding='UTF-8', newline='') as file:
+        if os.path.splitext(path)[1].lower() == '.json':
+            for item in iter_json_array(file):
+                yield tuple(item[field] for field in fields)
+        else:
+            for row in csv.reader(file):
+                if len(row) == len(fields):
+                    yield tuple(row)
+
+
+class RowsFile(io.TextIOBase):
+    """
+    Файлоподобный объект, отдающий строки в формате CSV для COPY.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ''
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        while size < 0 or len(self.buffer) + output.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            writer.writerow(row)
+            self.count += 1
+        self.buffer += output.getvalue()
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def _copy_import(model, fields, rows):
+    """
+    PostgreSQL: COPY во временную таблицу и перенос новых строк
+    одним INSERT ... ON CONFLICT DO NOTHING. Значения всех колонок
+    готовятся как в bulk_create (pre_save и значения по умолчанию):
+    у колонок вроде Ingredient.usage_count нет DEFAULT в БД.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    model_fields = [field for field in model._meta.concrete_fields
+                    if not field.primary_key]
+    columns = ', '.join(quote(field.column) for field in model_fields)
+    staging = quote(f'{model._meta.db_table}_import')
+    source = RowsFile(
+        [field.get_db_prep_save(field.pre_save(obj, True), connection)
+         for field in model_fields]
+        for obj in (model(**dict(zip(fields, row))) for row in rows)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        cursor.copy_expert(
+            f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)',
+            source,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT DISTINCT {columns} FROM {staging} '
+            f'ON CONFLICT DO NOTHING'
+        )
+        inserted = cursor.rowcount
+    return source.count, inserted
+
+
+def _bulk_import(model, fields, rows, chunk_size):
+    before = model.objects.count()
+    total = 0
+    for chunk in batched(rows, chunk_size):
+        model.objects.bulk_create(
+            (model(**dict(zip(fields, row))) for row in chunk),
+            ignore_conflicts=True,
+        )
+        total += len(chunk)
+    return total, model.objects.count() - before
+
+
+def import_rows(model, fields, rows, chunk_size=5000):
+    """
+    Идемпотентная загрузка строк в модель: записи, нарушающие
+    ограничения уникальности, пропускаются.
+    """
+    started = time.monotonic()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            total, inserted = _copy_import(model, fields, rows)
+        else:
+            total, inserted = _bulk_import(model, fields, rows, chunk_size)
+    return ImportResult(total, inserted, time.monotonic() - started)
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import (  # isort:skip
+    FavoriteRecipe,
+    Recipe,
+    RecipeIngredient,
+    ShoppingList
+)
+from .bulk import delete_rows  # isort:skip
+from .counters import change_counter  # isort:skip
+from .shopping_list import (  # isort:skip
+    change_shopping_items,
+    invalidate_shopping_lists
+)
+
+User = get_user_model()
+
+RELATION_COUNTERS = {
+    FavoriteRecipe: 'favorites_count',
+    ShoppingList: 'in_carts_count',
+}
+
+
+def _lock_user(user):
+    """
+    Изменения связей одного пользователя выполняются по очереди:
+    между проверкой существующих связей и записью их никто
+    не добавит и не удалит, счетчики не уйдут.
+    """
+    list(User.objects.select_for_update().filter(
+        pk=user.pk).values_list('pk', flat=True))
+
+
+def _relations_changed(model, user, recipe_ids, delta):
+    """
+    Пакетные вставка и удаление сигналов не отправляют: счетчики
+    рецептов и сводный список покупок меняются здесь.
+    """
+    change_counter(Recipe, recipe_ids, RELATION_COUNTERS[model], delta)
+    if model is not ShoppingList:
+        return
+    invalidate_shopping_lists([user.pk])
+    amounts = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids,
+    ).values('ingredient_id').annotate(
+        total=Sum('amount'),
+    ).values_list('ingredient_id', 'total').order_by()
+    change_shopping_items([user.pk], {
+        ingredient_id: total * delta for ingredient_id, total in amounts
+    })
+
+
+@transaction.atomic
+def add_relations(model, user, recipe_ids):
+    """
+    Добавляет рецепты в избранное или список покупок (model)
+    одним bulk_create. Уже добавленные рецепты пропускаются.
+    Возвращает id добавленных рецептов.
+    """
+    _lock_user(user)
+    existing = set(model.objects.filter(
+        user=user, recipe_id__in=recipe_ids,
+    ).values_list('recipe_id', flat=True))
+    added = [pk for pk in recipe_ids if pk not in existing]
+    if added:
+        model.objects.bulk_create(
+            (model(user=user, recipe_id=pk) for pk in added),
+            ignore_conflicts=True,
+        )
+        _relations_changed(model, user, added, 1)
+    return added
+
+
+@transaction.atomic
+def remove_relations(model, user, recipe_ids):
+    """
+    Удаляет рецепты из избранного или списка покупок одним DELETE
+    (delete_rows): QuerySet.delete() при подключенных сигналах
+    удалял бы записи с обработкой каждой по отдельности. Сигналы
+    заменяет _relations_changed.
+    Возвращает id удаленных рецептов.
+    """
+    _lock_user(user)
+    queryset = model.objects.filter(user=user, recipe_id__in=recipe_ids)
+    removed = list(queryset.values_list('recipe_id', flat=True))
+    if removed:
+        _relations_changed(model, user, removed, -1)
+        delete_rows(queryset)
+    return removed
@@ -0,0 +1,90 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import connections, router, transaction
+from django.db.models import OuterRef, Subquery
+
+from recipes.models import (  # isort:skip
+    SEARCH_TABLE,
+    Recipe,
+    RecipeIngredient
+)
+
+
+def _postgresql_update(queryset):
+    # Импорт требует psycopg2, поэтому выполняется только для PostgreSQL.
+    from django.contrib.postgres.aggregates import StringAgg
+
+    ingredients = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk'),
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' '),
+    ).values('names')
+    config = settings.SEARCH_CONFIG
+    return queryset.update(search_vector=(
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(Subquery(ingredients), weight='B', config=config)
+        + SearchVector('text', weight='C', config=config)
+    ))
+
+
+def _sqlite_update(queryset):
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({sql})', params)
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT recipe.id, recipe.name, ('
+            f'  SELECT group_concat(ingredient.name, \' \') '
+            f'  FROM recipes_recipeingredient item '
+            f'  JOIN recipes_ingredient ingredient '
+            f'  ON ingredient.id = item.ingredient_id '
+            f'  WHERE item.recipe_id = recipe.id'
+            f'), recipe.text FROM recipes_recipe recipe '
+            f'WHERE recipe.id IN ({sql})',
+            params,
+        )
+        return cursor.rowcount
+
+
+def update_search_documents(queryset=None):
+    """
+    Пересчет поисковых документов рецептов queryset (по умолчанию -
+    всех): название, названия ингредиентов и описание. На PostgreSQL
+    документ хранится в Recipe.search_vector (индекс GIN), на SQLite -
+    в таблице FTS5 SEARCH_TABLE. Возвращает число рецептов.
+    """
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    alias = router.db_for_write(Recipe)
+    queryset = queryset.using(alias)
+    vendor = connections[alias].vendor
+    if vendor == 'postgresql':
+        return _postgresql_update(queryset)
+    if vendor == 'sqlite':
+        return _sqlite_update(queryset)
+    return 0
+
+
+def update_search_on_commit(queryset):
+    """
+    Документы пересчитываются после фиксации транзакции: при создании
+    рецепта ингредиенты добавляются уже после сохранения модели.
+    """
+    transaction.on_commit(lambda: update_search_documents(queryset))
+
+
+def delete_search_documents(recipe_ids):
+    """
+    На SQLite документы удаленных рецептов удаляются из таблицы FTS5,
+    на PostgreSQL они удаляются вместе с рецептом.
+    """
+    connection = connections[router.db_for_write(Recipe)]
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN '
+            f'({", ".join(["%s"] * len(recipe_ids))})',
+            list(recipe_ids),
+        )
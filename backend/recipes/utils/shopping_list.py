@@ -1,17 +1,226 @@
-from django.db.models import F, Sum
+import csv
+import hashlib
+import json
+from datetime import timedelta
 
-from recipes.models import RecipeIngredient
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from recipes.models import (  # isort:skip
+    RecipeIngredient,
+    ShoppingList,
+    ShoppingListItem,
+    ShoppingListPdf
+)
+
+CACHE_KEY = 'shopping_list_pdf:{user_id}'
 
 
 def get_list_ingredients(user):
     """
-    Cуммирование позиций из разных рецептов.
+    Позиции сводного списка покупок: одно сканирование по индексу
+    (user, ingredient) без суммирования по рецептам.
+    """
+    return ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'amount', 'ingredient__measurement_unit'
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def recipe_amounts(recipe_id):
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+def change_shopping_items(user_ids, amounts):
+    """
+    Прибавляет к сводным спискам пользователей приращения
+    ingredient_id -> amount (отрицательные - вычитание).
+    Недостающие позиции создаются, обнулившиеся - удаляются.
+    """
+    amounts = {key: value for key, value in amounts.items() if value}
+    user_ids = list(user_ids)
+    if not amounts or not user_ids:
+        return
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+         for user_id in user_ids
+         for ingredient_id, amount in amounts.items() if amount > 0),
+        ignore_conflicts=True,
+    )
+    items = ShoppingListItem.objects.filter(user_id__in=user_ids,
+                                            ingredient_id__in=amounts)
+    items.update(amount=Greatest(
+        F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()),
+            output_field=models.IntegerField(),
+        ),
+        0,
+    ))
+    if min(amounts.values()) < 0:
+        items.filter(amount=0).delete()
+
+
+def actual_shopping_items(user_ids=None):
+    """
+    Суммы ингредиентов по рецептам списков покупок:
+    (user_id, ingredient_id, amount).
     """
+    queryset = ShoppingList.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    return queryset.filter(
+        recipe__recipe_ingredient__isnull=False,
+    ).values('user_id', 'recipe__recipe_ingredient__ingredient_id').annotate(
+        total=Sum('recipe__recipe_ingredient__amount'),
+    ).values_list(
+        'user_id', 'recipe__recipe_ingredient__ingredient_id', 'total',
+    ).order_by()
 
-    ingredients = RecipeIngredient.objects.filter(
-        recipe__shopping_recipe__user=user).values(
-        name=F('ingredient__name'),
-        measurement_unit=F('ingredient__measurement_unit')
-    ).annotate(amount=Sum('amount')).values_list(
-        'ingredient__name', 'amount', 'ingredient__measurement_unit')
-    return ingredients
+
+def rebuild_shopping_items(user_ids=None):
+    """
+    Полный пересчет сводных списков (всех или указанных
+    пользователей). Возвращает число позиций.
+    """
+    with transaction.atomic():
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            items = items.filter(user_id__in=user_ids)
+        items.delete()
+        # Django 2.2 не ограничивает batch_size лимитами SQLite
+        # (500 строк и 999 параметров в одном INSERT).
+        return len(ShoppingListItem.objects.bulk_create(
+            (ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                              amount=amount)
+             for user_id, ingredient_id, amount
+             in actual_shopping_items(user_ids).iterator()),
+            batch_size=300,
+        ))
+
+
+def find_shopping_items_drift():
+    """
+    id пользователей, чьи сводные списки расходятся с рецептами
+    в списках покупок.
+    """
+    stored = set(ShoppingListItem.objects.values_list(
+        'user_id', 'ingredient_id', 'amount').iterator())
+    actual = set(actual_shopping_items().iterator())
+    return sorted({row[0] for row in stored ^ actual})
+
+
+def invalidate_shopping_lists(user_ids):
+    """
+    Сброс ссылок пользователей на готовые PDF после изменения
+    их списков покупок. Выполняется после фиксации транзакции, чтобы
+    параллельный запрос не закэшировал ссылку на PDF прежнего списка.
+    """
+    keys = [CACHE_KEY.format(user_id=user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def retry_delay(pdf):
+    """
+    Секунд до повторной попытки рендеринга PDF со статусом failed
+    (задержка удваивается с каждой попыткой) или None, если попытки
+    исчерпаны.
+    """
+    if pdf.attempts >= settings.SHOPPING_LIST_PDF_MAX_ATTEMPTS:
+        return None
+    if pdf.failed_at is None:
+        return 0
+    retry_at = pdf.failed_at + timedelta(
+        seconds=settings.SHOPPING_LIST_PDF_RETRY_DELAY
+        * 2 ** (pdf.attempts - 1))
+    return max((retry_at - timezone.now()).total_seconds(), 0)
+
+
+def get_shopping_list_pdf(user):
+    """
+    Запись ShoppingListPdf для текущего списка покупок пользователя.
+    Если PDF для такого набора позиций еще нет, создается задание
+    для фонового рендеринга (manage.py render_shopping_lists).
+    Неудачное задание ставится в очередь повторно, когда истекла
+    задержка retry_delay.
+    """
+    key = CACHE_KEY.format(user_id=user.id)
+    digest = cache.get(key)
+    pdf = digest and ShoppingListPdf.objects.filter(digest=digest).first()
+    if not pdf:
+        ingredients = json.dumps(
+            [list(row) for row in get_list_ingredients(user)],
+            ensure_ascii=False,
+        )
+        digest = hashlib.sha256(ingredients.encode()).hexdigest()
+        pdf, _ = ShoppingListPdf.objects.get_or_create(
+            digest=digest, defaults={'ingredients': ingredients},
+        )
+        cache.set(key, digest, settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    if pdf.status == ShoppingListPdf.FAILED and retry_delay(pdf) == 0:
+        ShoppingListPdf.objects.filter(
+            pk=pdf.pk, status=ShoppingListPdf.FAILED,
+        ).update(status=ShoppingListPdf.PENDING)
+        pdf.status = ShoppingListPdf.PENDING
+    return pdf
+
+
+def render_shopping_list_pdf(pdf):
+    """
+    Рендеринг PDF через WeasyPrint. Вызывается только в фоновом
+    процессе, веб-воркеры WeasyPrint не импортируют.
+    """
+    from weasyprint import HTML
+
+    html_template = render_to_string(
+        'recipes/pdf_template.html',
+        {'ingredients': json.loads(pdf.ingredients)},
+    )
+    result = HTML(string=html_template).write_pdf()
+    pdf.file.save(f'{pdf.digest}.pdf', ContentFile(result), save=False)
+    pdf.status = ShoppingListPdf.READY
+    pdf.save(update_fields=('file', 'status'))
+
+
+class Echo:
+    """
+    Псевдо-буфер для csv.writer: возвращает записанную строку.
+    """
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def stream_shopping_list(user, fmt):
+    """
+    Построчная выгрузка списка покупок в формате txt, csv или json
+    без промежуточного HTML-документа.
+    """
+    rows = get_list_ingredients(user).iterator()
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for row in rows:
+            yield writer.writerow(row)
+    elif fmt == 'json':
+        separator = '['
+        for name, amount, measurement_unit in rows:
+            yield separator + json.dumps(
+                {'name': name, 'amount': amount,
+                 'measurement_unit': measurement_unit},
+                ensure_ascii=False,
+            )
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+    else:
+        yield 'Список покупок\n\n'
+        for name, amount, measurement_unit in rows:
+            yield f'{name} - {amount} {measurement_unit}\n'
@@ -1,27 +1,53 @@
-from django.http import HttpResponse
-from django.template.loader import render_to_string
+import math
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
-from weasyprint import HTML
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
-from foodgram.pagination import LimitPageNumberPaginator
+from foodgram.db_router import ReplicaReadMixin
+from foodgram.metrics import timed_serializer
+from foodgram.pagination import MAX_PAGE_SIZE, OptionalCursorPaginator
+from foodgram.throttling import RELATION_THROTTLES
+from .caching import CachedCatalogMixin, ConditionalGetMixin
 from .filters import IngredientFilter, RecipeFilter
-from .models import (Ingredient, Recipe, Tag)
+from .models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    ShoppingList,
+    ShoppingListItem,
+    ShoppingListPdf,
+    Tag
+)
+from .parsers import StreamingImageJSONParser
 from .permissions import IsAdminOrReadOnly, IsAuthorOrAdmin
+from .payloads import recipe_payloads
+from .renderers import CSVRenderer, FastJSONRenderer, PlainTextRenderer
 from .serializers import (
     AddRecipeSerializer,
     IngredientSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
+    ShoppingListItemSerializer,
     ShowRecipeSerializer,
     TagSerializer
 )
-from .utils.shopping_list import get_list_ingredients
+from .utils.feed import feed_recipe_ids
+from .utils.relations import add_relations, remove_relations
+from .utils.shopping_list import (get_shopping_list_pdf, retry_delay,
+                                  stream_shopping_list)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                     viewsets.ModelViewSet):
     """
     ViewSet для обработки рецептов.
     """
@@ -34,53 +60,264 @@ class RecipesViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrAdmin,)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
-    pagination_class = LimitPageNumberPaginator
+    pagination_class = OptionalCursorPaginator
+    # Порядок по релевантности и популярности не сочетается с курсором.
+    cursor_ordering_params = ('search', 'ordering')
+    parser_classes = (StreamingImageJSONParser, FormParser, MultiPartParser)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    SHOPPING_LIST_FORMATS = {
+        'txt': ('text/plain; charset=utf-8', 'txt'),
+        'csv': ('text/csv; charset=utf-8', 'csv'),
+        'json': ('application/json; charset=utf-8', 'json'),
+    }
+
+    def get_queryset(self):
+        if self.action in self.serializer_classes:
+            return Recipe.objects.with_related(self.request.user)
+        return super().get_queryset()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'retrieve':
+            context['image_variant'] = 'full'
+        return context
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action,
                                            self.default_serializer_class)
 
-    def _favorite_shopping_post_delete(self, related_manager):
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self._close_upload()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self._close_upload()
+
+    def _close_upload(self):
+        """
+        Временный файл от StreamingImageJSONParser уже перемещен
+        в хранилище; закрытие не дает удалить его повторно при сборке
+        мусора.
+        """
+        image = self.request.data.get('image')
+        if hasattr(image, 'temporary_file_path'):
+            image.close()
+
+    def list(self, request, *args, **kwargs):
+        """
+        Страница сначала выбирается легким запросом validators():
+        если ETag совпадает с If-None-Match, возвращается 304 без
+        загрузки рецептов. Иначе страница строится recipe_payloads()
+        из values() без ShowRecipeSerializer.
+        """
+        queryset = self.filter_queryset(Recipe.objects.all())
+        rows = self.paginate_queryset(queryset.validators(request.user))
+        meta = self.get_paginated_response([]).data
+        etag, last_modified = self.get_validators(
+            request, rows, list(meta.items()))
+        response = self.get_conditional_response(request, etag,
+                                                 last_modified)
+        if response is not None:
+            return response
+        with timed_serializer():
+            payloads = recipe_payloads([row['id'] for row in rows],
+                                       self.get_serializer_context())
+        response = self.get_paginated_response(payloads)
+        return self.set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Ревалидация рецепта - один запрос по первичному ключу,
+        данные рецепта - recipe_payloads().
+        """
+        try:
+            row = Recipe.objects.filter(pk=kwargs['pk']).validators(
+                request.user).first()
+        except ValueError:
+            row = None
+        if row is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request, [row])
+        response = self.get_conditional_response(request, etag,
+                                                 last_modified)
+        if response is not None:
+            return response
+        with timed_serializer():
+            payloads = recipe_payloads([row['id']],
+                                       self.get_serializer_context())
+        if not payloads:
+            return super().retrieve(request, *args, **kwargs)
+        response = Response(payloads[0])
+        return self.set_validators(response, etag, last_modified)
+
+    def _favorite_shopping_post_delete(self, model, message):
+        """
+        Связь и счетчик рецепта меняются в одной транзакции.
+        """
         recipe = self.get_object()
         if self.request.method == 'DELETE':
-            related_manager.get(recipe_id=recipe.id).delete()
+            if not remove_relations(model, self.request.user, [recipe.id]):
+                raise ValidationError(message['missing'])
             return Response(status=status.HTTP_204_NO_CONTENT)
-        if related_manager.filter(recipe=recipe).exists():
-            raise ValidationError('Рецепт уже в избранном')
-        related_manager.create(recipe=recipe)
+        if not add_relations(model, self.request.user, [recipe.id]):
+            raise ValidationError(message['exists'])
         serializer = RecipeSerializer(instance=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def _favorite_shopping_batch(self, model):
+        """
+        Пакетное изменение: {"ids": [1, 2, 3]} добавляется
+        одним bulk_create или удаляется одним DELETE. Добавление
+        возвращает краткие данные всех переданных рецептов,
+        удаление пропускает рецепты, которых нет в списке.
+        """
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        if self.request.method == 'DELETE':
+            remove_relations(model, self.request.user, ids)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        recipes = Recipe.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in recipes]
+        if missing:
+            raise ValidationError({'ids': [
+                f'Рецепты не найдены: {", ".join(map(str, missing))}'
+            ]})
+        add_relations(model, self.request.user, ids)
+        serializer = RecipeSerializer([recipes[pk] for pk in ids], many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(detail=True,
             permission_classes=[permissions.IsAuthenticated],
+            throttle_classes=RELATION_THROTTLES,
             methods=['POST', 'DELETE'], )
     def favorite(self, request, pk=None):
-        return self._favorite_shopping_post_delete(
-            request.user.favorite
-        )
+        return self._favorite_shopping_post_delete(FavoriteRecipe, {
+            'exists': 'Рецепт уже в избранном',
+            'missing': 'Рецепта нет в избранном',
+        })
+
+    @action(detail=False,
+            url_path='favorite',
+            url_name='favorite-batch',
+            permission_classes=[permissions.IsAuthenticated],
+            throttle_classes=RELATION_THROTTLES,
+            methods=['POST', 'DELETE'], )
+    def favorite_batch(self, request):
+        return self._favorite_shopping_batch(FavoriteRecipe)
 
     @action(detail=True,
             permission_classes=[permissions.IsAuthenticated],
+            throttle_classes=RELATION_THROTTLES,
             methods=['POST', 'DELETE'], )
     def shopping_cart(self, request, pk=None):
-        return self._favorite_shopping_post_delete(
-            request.user.shopping_user
-        )
+        return self._favorite_shopping_post_delete(ShoppingList, {
+            'exists': 'Рецепт уже в списке покупок',
+            'missing': 'Рецепта нет в списке покупок',
+        })
+
+    @action(detail=False,
+            url_path='shopping_cart',
+            url_name='shopping-cart-summary',
+            permission_classes=[permissions.IsAuthenticated],
+            throttle_classes=RELATION_THROTTLES, )
+    def shopping_cart_summary(self, request):
+        """
+        Сводный список покупок: ингредиенты всех рецептов списка
+        с суммарным количеством.
+        """
+        items = ShoppingListItem.objects.filter(
+            user=request.user,
+        ).select_related('ingredient').order_by(
+            'ingredient__name', 'ingredient__measurement_unit')
+        return Response(ShoppingListItemSerializer(items, many=True).data)
+
+    @shopping_cart_summary.mapping.post
+    @shopping_cart_summary.mapping.delete
+    def shopping_cart_batch(self, request):
+        return self._favorite_shopping_batch(ShoppingList)
+
+    @action(detail=False,
+            permission_classes=[permissions.IsAuthenticated], )
+    def feed(self, request):
+        """
+        Лента рецептов авторов из подписок, новые - первыми.
+        Keyset-пагинация: ?limit=, ссылка next содержит ?before=<id>.
+        """
+        try:
+            limit = int(request.query_params.get(
+                'limit', api_settings.PAGE_SIZE))
+            before = request.query_params.get('before')
+            before = None if before is None else int(before)
+        except ValueError:
+            raise ValidationError('limit и before - целые числа')
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        ids = feed_recipe_ids(request.user, limit + 1, before)
+        next_url = None
+        if len(ids) > limit:
+            ids = ids[:limit]
+            next_url = replace_query_param(request.build_absolute_uri(),
+                                           'before', ids[-1])
+        with timed_serializer():
+            payloads = recipe_payloads(ids, self.get_serializer_context())
+        return Response({'next': next_url, 'results': payloads})
 
-    @action(detail=False)
+    @action(detail=False,
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[JSONRenderer, BrowsableAPIRenderer,
+                              PlainTextRenderer, CSVRenderer], )
     def download_shopping_cart(self, request):
-        ingredients = get_list_ingredients(request.user)
-        html_template = render_to_string('recipes/pdf_template.html',
-                                         {'ingredients': ingredients})
-        html = HTML(string=html_template)
-        result = html.write_pdf()
-        response = HttpResponse(result, content_type='application/pdf;')
+        """
+        ?format=txt|csv|json - потоковая выгрузка списка без PDF.
+        PDF рендерится фоновым процессом и кэшируется по хэшу
+        содержимого списка. Пока файл не готов, возвращается 202
+        с адресом для повторного запроса, при ошибке рендеринга - 503
+        (с Retry-After, пока не исчерпаны повторные попытки).
+        """
+        fmt = request.query_params.get('format')
+        if fmt in self.SHOPPING_LIST_FORMATS:
+            content_type, extension = self.SHOPPING_LIST_FORMATS[fmt]
+            response = StreamingHttpResponse(
+                stream_shopping_list(request.user, fmt),
+                content_type=content_type,
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename=shopping_list.{extension}'
+            )
+            return response
+        pdf = get_shopping_list_pdf(request.user)
+        if pdf.status == ShoppingListPdf.FAILED:
+            delay = retry_delay(pdf)
+            return Response(
+                {'status': pdf.status,
+                 'errors': 'Не удалось сформировать PDF, скачайте список '
+                           'в формате ?format=txt'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={} if delay is None else {
+                    'Retry-After': str(math.ceil(delay))},
+            )
+        if pdf.status != ShoppingListPdf.READY:
+            poll_url = request.build_absolute_uri()
+            return Response(
+                {'status': pdf.status, 'poll_url': poll_url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Location': poll_url, 'Retry-After': '1'},
+            )
+        if settings.SHOPPING_LIST_ACCEL_REDIRECT:
+            response = HttpResponse(content_type='application/pdf')
+            response['X-Accel-Redirect'] = (
+                settings.SHOPPING_LIST_ACCEL_REDIRECT + pdf.file.name
+            )
+        else:
+            response = FileResponse(pdf.file.open('rb'),
+                                    content_type='application/pdf')
         response['Content-Disposition'] = 'inline; filename=shopping_list.pdf'
-        response['Content-Transfer-Encoding'] = 'binary'
         return response
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, CachedCatalogMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для обработки тэгов.
     """
@@ -90,7 +327,8 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, CachedCatalogMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для обработки ингредиентов.
     """
@@ -99,3 +337,30 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    AUTOCOMPLETE_LIMIT = 10
+    AUTOCOMPLETE_MAX_LIMIT = 50
+
+    def get_catalog_query(self, request):
+        """
+        Выдача зависит только от начала названия без учета регистра.
+        """
+        return request.query_params.get('name', '').lower()
+
+    @action(detail=False, filter_backends=[])
+    def autocomplete(self, request):
+        """
+        Подсказки по ?name= для редактора рецептов: не более ?limit=
+        ингредиентов, сначала совпадения по началу названия,
+        затем по вхождению, внутри - по популярности.
+        """
+        term = request.query_params.get('name', '').strip()
+        if not term:
+            return Response([])
+        try:
+            limit = int(request.query_params.get('limit',
+                                                 self.AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': 'Ожидается целое число'})
+        limit = max(1, min(limit, self.AUTOCOMPLETE_MAX_LIMIT))
+        ingredients = Ingredient.objects.autocomplete(term, limit)
+        return Response(self.get_serializer(ingredients, many=True).data)
@@ -0,0 +1,53 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+CACHE_KEY = 'auth_token:{digest}'
+# Счетчики меняются запросами UPDATE без сохранения пользователя:
+# в снимок они не попадают, поэтому save() их не перезаписывает,
+# а при обращении значения читаются из БД.
+DEFERRED_USER_FIELDS = ('recipes_count', 'followers_count')
+
+
+def token_cache_key(key):
+    return CACHE_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def evict_tokens(keys):
+    """
+    Удаление снимков токенов после фиксации транзакции: до нее
+    параллельный запрос заново закэшировал бы прежние данные.
+    """
+    transaction.on_commit(lambda: cache.delete_many(
+        [token_cache_key(key) for key in keys]))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication со снимком токена и пользователя в общем
+    кэше на AUTH_TOKEN_CACHE_TIMEOUT секунд: запрос к БД нужен только
+    при промахе. Снимок удаляется сигналами при удалении токена
+    (выход, удаление пользователя) и сохранении пользователя
+    (смена пароля, деактивация, изменение профиля).
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        token = cache.get(cache_key)
+        if token is None:
+            try:
+                token = Token.objects.select_related('user').defer(
+                    *(f'user__{field}' for field in DEFERRED_USER_FIELDS)
+                ).get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, token, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
@@ -0,0 +1,14 @@
+from rest_framework.filters import SearchFilter
+
+
+class AuthorSearchFilter(SearchFilter):
+    """
+    ?search= - поиск автора по началу логина без учета регистра,
+    выполняется по индексу lower(username).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return queryset.username_startswith(' '.join(terms))
@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+import recipes.fields
+import users.models
+
+
+def fill_username_lower(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    users = list(User.objects.only('id', 'username'))
+    for user in users:
+        user.username_lower = user.username.lower()
+    User.objects.bulk_update(users, ('username_lower',), batch_size=300)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='username_lower',
+            field=recipes.fields.LowercaseField(default='', editable=False, max_length=150, source='username', verbose_name='Логин в нижнем регистре'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_username_lower, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['username_lower'], name='user_username_lower_idx', opclasses=('text_pattern_ops',)),
+        ),
+    ]
@@ -1,8 +1,31 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 from django.db.models import F, Q
 from django.utils.translation import gettext_lazy as _
 
+from recipes.fields import LowercaseField  # isort:skip
+
+
+class UserQuerySet(models.QuerySet):
+
+    def username_startswith(self, term):
+        """
+        Поиск по началу логина без учета регистра (колонка
+        username_lower). Диапазонное условие позволяет SQLite
+        использовать индекс, на PostgreSQL используется индекс
+        text_pattern_ops.
+        """
+        term = term.lower()
+        return self.filter(
+            username_lower__startswith=term,
+            username_lower__gte=term,
+            username_lower__lt=term + '\U0010ffff',
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class User(AbstractUser):
     USER = 'user'
@@ -59,9 +82,35 @@ class User(AbstractUser):
         max_length=150,
         help_text=_('Введите пароль'),
     )
+    # Счетчики меняются запросами UPDATE в обход save() (сигналы,
+    # recount); save() существующего пользователя их не записывает,
+    # иначе параллельные изменения затирались бы загруженными значениями.
+    UPDATE_ONLY_FIELDS = ('recipes_count', 'followers_count')
+    recipes_count = models.PositiveIntegerField(
+        verbose_name=_('Количество рецептов'),
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name=_('Количество подписчиков'),
+        default=0,
+        editable=False,
+    )
+    username_lower = LowercaseField(
+        verbose_name=_('Логин в нижнем регистре'),
+        source='username',
+        max_length=150,
+    )
     # USERNAME_FIELD = 'email'
 
+    objects = CustomUserManager()
+
     class Meta:
+        indexes = (
+            models.Index(fields=('username_lower',),
+                         name='user_username_lower_idx',
+                         opclasses=('text_pattern_ops',)),
+        )
         swappable = 'AUTH_USER_MODEL'
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
@@ -69,6 +118,16 @@ class User(AbstractUser):
     def __str__(self):
         return self.get_full_name()
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname in self.__dict__
+                and field.name not in self.UPDATE_ONLY_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def is_moderator(self):
         return self.is_staff or self.role == self.MODERATOR
@@ -1,13 +1,29 @@
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 
+from foodgram.metrics import TimedSerializerMixin
 from recipes.models import Recipe
+from recipes.serializer_fields import RecipeImageField
 from .models import Follow
 
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    """
+    Значение ?recipes_limit= (None - без ограничения).
+    """
+    value = request.query_params.get('recipes_limit')
+    if value is None:
+        return None
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        raise ValidationError({'recipes_limit': 'Ожидается целое число'})
+
+
 class CurrentUserDefaultId(object):
     requires_context = True
 
@@ -17,7 +33,7 @@ class CurrentUserDefaultId(object):
             return self.user_id
 
 
-class CustomUserCreateSerializer(UserCreateSerializer):
+class CustomUserCreateSerializer(TimedSerializerMixin, UserCreateSerializer):
     """
     Сериализатор для модели User.
     """
@@ -33,7 +49,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     """
     Сериализатор для модели User.
     """
@@ -57,20 +73,25 @@ class CustomUserSerializer(UserSerializer):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=self.context['request'].user,
                                      author=obj).exists()
 
 
-class FollowRecipeSerializer(serializers.ModelSerializer):
+class FollowRecipeSerializer(TimedSerializerMixin,
+                             serializers.ModelSerializer):
     """
     Сериализатор для короткой модели рецепта в подписках.
     """
+    image = RecipeImageField('thumb')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для подписок.
     """
@@ -92,22 +113,28 @@ class FollowSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if not user:
             return False
         return Follow.objects.filter(user=user, author=obj).exists()
 
     def get_recipes(self, obj):
+        """
+        Рецепты, выбранные заранее для всей страницы
+        (latest_by_author), берутся из obj.latest_recipes.
+        """
         request = self.context.get('request')
-        limit_recipes = request.query_params.get('recipes_limit')
-        if limit_recipes is not None:
-            recipes = obj.recipes.all()[:(int(limit_recipes))]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
         else:
-            recipes = obj.recipes.all()
+            limit_recipes = get_recipes_limit(request)
+            recipes = obj.recipes.all()[:limit_recipes]
         context = {'request': request}
         return FollowRecipeSerializer(recipes, many=True,
                                       context=context).data
 
     @staticmethod
     def get_recipes_count(obj):
-        return obj.recipes.count()
+        return obj.recipes_count
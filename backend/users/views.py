@@ -1,25 +1,44 @@
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Value
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from djoser import utils
 from djoser.views import TokenDestroyView
-from rest_framework import filters, permissions, status, viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import (api_view, permission_classes,
+                                       throttle_classes)
 from rest_framework.response import Response
 
-from foodgram.pagination import LimitPageNumberPaginator
+from foodgram.db_router import ReplicaReadMixin
+from foodgram.pagination import OptionalCursorPaginator
+from foodgram.throttling import RELATION_THROTTLES
+from recipes.models import Recipe
+from .filters import AuthorSearchFilter
 from .models import Follow, User
-from .serializers import FollowSerializer
+from .serializers import FollowSerializer, get_recipes_limit
+
+
+def attach_latest_recipes(authors, request):
+    """
+    Последние рецепты всех авторов страницы одним запросом.
+    """
+    authors = list(authors)
+    recipes = Recipe.objects.latest_by_author(
+        [author.id for author in authors], get_recipes_limit(request))
+    for author in authors:
+        author.latest_recipes = recipes[author.id]
+    return authors
 
 
 @api_view(['POST', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated, ])
+@throttle_classes(RELATION_THROTTLES)
 def follow_author(request, pk):
     """
     Подписка на автора.
     """
-    user = get_object_or_404(User, username=request.user.username)
+    user = request.user
     author = get_object_or_404(User, pk=pk)
 
     if request.method == 'POST':
@@ -27,11 +46,17 @@ def follow_author(request, pk):
             content = {'errors': 'Нельзя подписаться на себя'}
             return Response(content, status=status.HTTP_400_BAD_REQUEST)
         try:
-            Follow.objects.create(user=user, author=author)
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=author)
         except IntegrityError:
             content = {'errors': 'Вы уже подписаны на данного автора'}
             return Response(content, status=status.HTTP_400_BAD_REQUEST)
-        follows = User.objects.all().filter(username=author)
+        follows = attach_latest_recipes(
+            User.objects.filter(pk=author.pk).annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+            ),
+            request,
+        )
         serializer = FollowSerializer(
             follows,
             context={'request': request},
@@ -50,22 +75,29 @@ def follow_author(request, pk):
                             status=status.HTTP_204_NO_CONTENT)
 
 
-class SubscriptionListView(viewsets.ReadOnlyModelViewSet):
+class SubscriptionListView(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для генерации списка подписок пользователя.
     """
     queryset = User.objects.all()
     serializer_class = FollowSerializer
-    pagination_class = LimitPageNumberPaginator
-    filter_backends = (filters.SearchFilter,)
+    pagination_class = OptionalCursorPaginator
+    filter_backends = (AuthorSearchFilter,)
     permission_classes = (permissions.IsAuthenticated,)
-    search_fields = ('^following__user',)
 
     def get_queryset(self):
         user = self.request.user
-        new_queryset = User.objects.filter(following__user=user)
+        new_queryset = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('-id')
         return new_queryset
 
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is None:
+            return None
+        return attach_latest_recipes(page, self.request)
+
 
 class CustomTokenDestroyView(TokenDestroyView):
 